@@ -1,22 +1,472 @@
 import datetime
+import hashlib
+import json
+import math
 import os
+import queue
 import random
+import sqlite3
+import sys
+import threading
 import time
 import zipfile
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
 from pathlib import Path
+from requests.adapters import HTTPAdapter
 from tqdm import tqdm
 import shutil
 
+try:
+    from blake3 import blake3  # Optional, faster than MD5 when the catalogue provides BLAKE3
+except ImportError:
+    blake3 = None
+
+# Region profiles: tiles to process and the first day to search for each country.
+# 'directory' (optional) is a separate data folder the region's products are linked into.
+REGION_PROFILES = {
+    'THAILAND': {
+        'start_day': '2025-02-23',
+        'tiles': ['T47QLA', 'T47QLB', 'T47PMR', 'T47PMT', 'T47QQB', 'T48QTE', 'T48QTD', 'T47PMS', 'T47QNC', 'T48QTF',
+                  'T47PRR', 'T48QVD', 'T47QMC', 'T47QMU', 'T47PRQ', 'T48QVE', 'T47PNP', 'T47QQA', 'T48QUF', 'T47PNQ',
+                  'T48PTC', 'T47PQS', 'T47PQT', 'T47PPT', 'T47PPS', 'T47QQT', 'T47QQS', 'T47QPT', 'T47QPS', 'T48QYJ',
+                  'T48QYK', 'T47PQU', 'T47PPS', 'T47PPR', 'T48PTA', 'T47QRV', 'T47QPC', 'T47QNB', 'T47QPB', 'T47QPA',
+                  'T47QLV', 'T48PTB', 'T48PUB', 'T48PVB', 'T48PWB', 'T48PWC', 'T48PUC', 'T48PVC', 'T47PNS']
+    },
+    'CAMBODIA': {
+        'start_day': '2025-02-01',
+        'tiles': ['T48PTA', 'T48PUA', 'T48PVA', 'T48PWA', 'T48PXA', 'T48PXB', 'T48PYB', 'T48PYA', 'T48PTV', 'T48PUV',
+                  'T48PVV', 'T48PWV', 'T48PXV', 'T48PYV', 'T48PTU', 'T48PUU', 'T48PVU', 'T48PWU', 'T48PXU', 'T48PYU',
+                  'T48PUT', 'T48PVT', 'T48PWT', 'T48PXT', 'T48PVS']
+    },
+    'LAO': {
+        'start_day': '2025-02-01',
+        'tiles': ['T47QQE', 'T47QRE', 'T48QTK', 'T47QPE', 'T47QPD', 'T47QPC', 'T47QQD', 'T47QRD', 'T48QTJ', 'T48QUJ',
+                  'T47QPC', 'T47QQC', 'T47QRC', 'T48QTH', 'T48QUH', 'T48QUH', 'T48QVJ', 'T48QVH', 'T47QPB', 'T47QQB',
+                  'T47QRB', 'T48QTG', 'T48QUG', 'T48QVG', 'T47QQA', 'T47QRA', 'T48QTF', 'T48QUF', 'T48QVF', 'T48QWF',
+                  'T47QQV', 'T47QRV', 'T48QTE', 'T48QVE', 'T48QWE', 'T48QVD', 'T48QWD', 'T48QXD', 'T48PWC', 'T48PXC',
+                  'T48PYC', 'T48PWB', 'T48PXB', 'T48PYB', 'T48PWA', 'T48PXA', 'T48PYA']
+    },
+    'MYANMAR': {
+        'start_day': '2025-02-01',
+        'tiles': ['T47RLM', 'T47RKL', 'T47RLL', 'T47RML', 'T46RGQ', 'T47RKK', 'T47RLK', 'T47RMK', 'T46RGP', 'T47RKJ',
+                  'T47RLJ', 'T47RMJ', 'T46RFP', 'T46RFN', 'T46RGN', 'T47RKH', 'T47RLH', 'T46QEM', 'T46QFM', 'T46QGM',
+                  'T47QKG', 'T47QLG', 'T47QMG', 'T46QEL', 'T46QFL', 'T46QGL', 'T47QKF', 'T47QLF', 'T47QMF', 'T47QNF',
+                  'T46QEK', 'T46QFK', 'T46QGK', 'T46QHK', 'T47QKE', 'T47QLE', 'T47QME', 'T47QNE', 'T47QPE', 'T47QQE',
+                  'T46QDK', 'T46QDJ', 'T46QEJ', 'T46QFJ', 'T46QGJ', 'T46QHJ', 'T47QKD', 'T47QLD', 'T47QMD', 'T47QND',
+                  'T47QPD', 'T47QQD', 'T46QDH', 'T46QEH', 'T46QFH', 'T46QGH', 'T46QHH', 'T47QKC', 'T47QLC', 'T47QMC',
+                  'T47QNC', 'T46QEG', 'T46QFG', 'T46QGG', 'T46QHG', 'T47QKB', 'T47QLB', 'T46QEF', 'T46QFF', 'T46QGF',
+                  'T46QHF', 'T47QKA', 'T47QLA', 'T46QFE', 'T46QGE', 'T46QHE', 'T47QKV', 'T47QLV', 'T46QFD', 'T46QGD',
+                  'T46QHD', 'T47QKU', 'T47QLU', 'T47QMU', 'T46PFC', 'T46PGC', 'T47PLT', 'T47PMT', 'T47PLS', 'T47PMS',
+                  'T47PLR', 'T47PMR', 'T47PNR', 'T47PMQ', 'T47PNQ', 'T47PMP', 'T47PNP', 'T47PMN', 'T47PNN', 'T47PMM']
+    },
+    'VIETNAM': {
+        'start_day': '2025-02-01',
+        'tiles': ['T47QRF', 'T48QTL', 'T48QUL', 'T48QVL', 'T48QWL', 'T48QXL', 'T48QTK', 'T47QRE', 'T48QUK', 'T48QVK',
+                  'T48QWK', 'T48QXK', 'T48QYK', 'T48QTJ', 'T48QUJ', 'T48QVJ', 'T48QWJ', 'T48QXJ', 'T48QYJ', 'T48QUH',
+                  'T48QVH', 'T48QWH', 'T48QXH', 'T48QUG', 'T48QVG', 'T48QWG', 'T48QVF', 'T48QWF', 'T48QWE', 'T48QXE',
+                  'T48QXD', 'T48QYD', 'T48PYC', 'T48PZC', 'T49PBT', 'T48PYB', 'T48PZB', 'T49PBS', 'T48PYA', 'T48PZA',
+                  'T49PBR', 'T49PCR', 'T48PYV', 'T48PZV', 'T49PBQ', 'T49PCQ', 'T48PYU', 'T48PZU', 'T49PBP', 'T49PCP',
+                  'T48PXU', 'T48PWT', 'T48PXT', 'T48PYT', 'T48PZT', 'T49PBN', 'T48PVS', 'T48PWS', 'T48PXS', 'T48PYS',
+                  'T48PVR', 'T48PWR', 'T48PXR', 'T48PVQ', 'T48PWQ']
+    }
+}
+
+
+# WGS84 / UTM constants for the offline MGRS tile footprints
+WGS84_A = 6378137.0
+WGS84_E2 = 0.00669437999014
+UTM_K0 = 0.9996
+MGRS_BANDS = 'CDEFGHJKLMNPQRSTUVWX'
+MGRS_COLUMNS = ('ABCDEFGH', 'JKLMNPQR', 'STUVWXYZ')
+MGRS_ROWS = 'ABCDEFGHJKLMNPQRSTUV'
+S2_TILE_SIZE = 109800  # Sentinel-2 tiles are 109.8 km, overlapping the 100 km MGRS square by 9.8 km
+
+
+def meridian_arc(lat):
+    """Distance along the central meridian from the equator to lat (radians)"""
+    e2 = WGS84_E2
+    return WGS84_A * ((1 - e2 / 4 - 3 * e2 ** 2 / 64 - 5 * e2 ** 3 / 256) * lat
+                      - (3 * e2 / 8 + 3 * e2 ** 2 / 32 + 45 * e2 ** 3 / 1024) * math.sin(2 * lat)
+                      + (15 * e2 ** 2 / 256 + 45 * e2 ** 3 / 1024) * math.sin(4 * lat)
+                      - (35 * e2 ** 3 / 3072) * math.sin(6 * lat))
+
+
+def utm_to_lonlat(zone, easting, northing, northern=True):
+    """Inverse transverse Mercator (WGS84) for a UTM coordinate, returns (lon, lat) in degrees"""
+    e2 = WGS84_E2
+    ep2 = e2 / (1 - e2)
+    e1 = (1 - math.sqrt(1 - e2)) / (1 + math.sqrt(1 - e2))
+    x = easting - 500000.0
+    y = northing if northern else northing - 10000000.0
+
+    mu = y / UTM_K0 / (WGS84_A * (1 - e2 / 4 - 3 * e2 ** 2 / 64 - 5 * e2 ** 3 / 256))
+    phi1 = (mu + (3 * e1 / 2 - 27 * e1 ** 3 / 32) * math.sin(2 * mu)
+            + (21 * e1 ** 2 / 16 - 55 * e1 ** 4 / 32) * math.sin(4 * mu)
+            + (151 * e1 ** 3 / 96) * math.sin(6 * mu)
+            + (1097 * e1 ** 4 / 512) * math.sin(8 * mu))
+
+    sin1, cos1, tan1 = math.sin(phi1), math.cos(phi1), math.tan(phi1)
+    n1 = WGS84_A / math.sqrt(1 - e2 * sin1 ** 2)
+    t1 = tan1 ** 2
+    c1 = ep2 * cos1 ** 2
+    r1 = WGS84_A * (1 - e2) / (1 - e2 * sin1 ** 2) ** 1.5
+    d = x / (n1 * UTM_K0)
+
+    lat = phi1 - (n1 * tan1 / r1) * (d ** 2 / 2
+                                     - (5 + 3 * t1 + 10 * c1 - 4 * c1 ** 2 - 9 * ep2) * d ** 4 / 24
+                                     + (61 + 90 * t1 + 298 * c1 + 45 * t1 ** 2 - 252 * ep2 - 3 * c1 ** 2) * d ** 6 / 720)
+    lon = (d - (1 + 2 * t1 + c1) * d ** 3 / 6
+           + (5 - 2 * c1 + 28 * t1 - 3 * c1 ** 2 + 8 * ep2 + 24 * t1 ** 2) * d ** 5 / 120) / cos1
+    return math.degrees(lon) + (zone - 1) * 6 - 180 + 3, math.degrees(lat)
+
+
+def mgrs_tile_footprint(tile):
+    """Footprint of a Sentinel-2 MGRS tile (e.g. 'T47QLA') as a list of (lon, lat) corners.
+    Computed offline from the MGRS grid definition, so no tile table has to be downloaded."""
+    tile = tile[1:] if tile.startswith('T') else tile
+    zone, band, column, row = int(tile[:2]), tile[2], tile[3], tile[4]
+
+    easting = (MGRS_COLUMNS[(zone - 1) % 3].index(column) + 1) * 100000
+    row_index = MGRS_ROWS.index(row)
+    if zone % 2 == 0:
+        row_index = (row_index - 5) % 20  # Even zones start their row letters at F
+    northing = row_index * 100000.0
+
+    # Row letters repeat every 2000 km; take the cycle closest to the middle of the latitude band
+    band_south = -80 + 8 * MGRS_BANDS.index(band)
+    northern = band_south >= 0
+    band_northing = UTM_K0 * meridian_arc(math.radians(band_south + 4)) + (0 if northern else 10000000.0)
+    northing = min((northing + cycle * 2000000 for cycle in range(5)),
+                   key=lambda n: abs(n + 50000 - band_northing))
+
+    corners = [(easting, northing + 100000), (easting + S2_TILE_SIZE, northing + 100000),
+               (easting + S2_TILE_SIZE, northing + 100000 - S2_TILE_SIZE),
+               (easting, northing + 100000 - S2_TILE_SIZE)]
+    return [utm_to_lonlat(zone, x, y, northern) for x, y in corners]
+
+
+class ProductIndex:
+    """Local SQLite index of catalogue search results and download state"""
+
+    def __init__(self, db_path):
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(str(db_path), check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        with self.connection:
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS products (
+                    id TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    tile TEXT,
+                    sensing_date TEXT,
+                    cloud_cover REAL,
+                    checksum TEXT,
+                    content_length INTEGER,
+                    status TEXT NOT NULL DEFAULT 'found',
+                    local_path TEXT,
+                    updated_at TEXT
+                )""")
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS idx_products_tile_date ON products (tile, sensing_date)")
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS idx_products_status ON products (status)")
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    tile TEXT PRIMARY KEY,
+                    high_water TEXT NOT NULL
+                )""")
+
+    def record_products(self, products):
+        """Insert or refresh search results without touching their download state"""
+        now = datetime.datetime.now().isoformat()
+        rows = [(p['id'], p['name'], p['tile'], p['sensing_date'], p['cloud_cover'],
+                 json.dumps(p['checksum']), p['content_length'], now) for p in products]
+        with self.lock, self.connection:
+            self.connection.executemany("""
+                INSERT INTO products (id, name, tile, sensing_date, cloud_cover, checksum, content_length, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET
+                    name = excluded.name,
+                    tile = excluded.tile,
+                    sensing_date = excluded.sensing_date,
+                    cloud_cover = excluded.cloud_cover,
+                    checksum = excluded.checksum,
+                    content_length = excluded.content_length,
+                    updated_at = excluded.updated_at""", rows)
+
+    def set_status(self, product, status, local_path=None):
+        """Record the download state (found, downloading, downloaded, failed, corrupt) of a product"""
+        self.record_products([product])
+        with self.lock, self.connection:
+            self.connection.execute(
+                "UPDATE products SET status = ?, local_path = COALESCE(?, local_path), updated_at = ? WHERE id = ?",
+                (status, str(local_path) if local_path else None, datetime.datetime.now().isoformat(), product['id']))
+
+    def get(self, product_id):
+        """Get the indexed row of a product, or None"""
+        with self.lock:
+            return self.connection.execute("SELECT * FROM products WHERE id = ?", (product_id,)).fetchone()
+
+    def downloaded_product(self, tile, date_range):
+        """Get a downloaded product of a tile sensed inside the date range, or None"""
+        start_date, end_date = date_range
+        with self.lock:
+            return self.connection.execute("""
+                SELECT * FROM products
+                WHERE tile = ? AND status = 'downloaded' AND sensing_date > ? AND sensing_date < ?
+                ORDER BY cloud_cover LIMIT 1""", (tile, start_date, end_date)).fetchone()
+
+    def missing_tiles(self, tiles, date_range):
+        """Tiles with no downloaded product inside the date range"""
+        return [tile for tile in tiles if self.downloaded_product(tile, date_range) is None]
+
+    def high_water(self, tile):
+        """Latest catalogue PublicationDate already synced for a tile, or None"""
+        with self.lock:
+            row = self.connection.execute("SELECT high_water FROM sync_state WHERE tile = ?", (tile,)).fetchone()
+        return row['high_water'] if row else None
+
+    def set_high_water(self, tile, high_water):
+        """Advance (never rewind) the synced PublicationDate of a tile"""
+        with self.lock, self.connection:
+            self.connection.execute("""
+                INSERT INTO sync_state (tile, high_water) VALUES (?, ?)
+                ON CONFLICT(tile) DO UPDATE SET high_water = MAX(high_water, excluded.high_water)""",
+                (tile, high_water))
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+class DownloadError(IOError):
+    """A transfer that went wrong and is worth another attempt: incomplete, overran its
+    ContentLength, changed on the server or failed its checksum"""
+
+
+class RangeNotSupported(Exception):
+    """The server answered a byte range request with the whole file"""
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter that honours Retry-After"""
+
+    retry_status_codes = {408, 425, 429, 500, 502, 503, 504}
+
+    def __init__(self, max_attempts=5, base_delay=2, max_delay=300, log=None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay  # Seconds before the first retry (before jitter)
+        self.max_delay = max_delay  # Upper bound of a single wait
+        self.log = log
+
+    @staticmethod
+    def http_status(error):
+        """Get (status code, Retry-After seconds) from an HTTP error or the error it wraps"""
+        while error is not None:
+            response = getattr(error, 'response', None)
+            if response is not None:
+                retry_after = response.headers.get('Retry-After')
+                return response.status_code, int(retry_after) if retry_after and retry_after.isdigit() else None
+            error = error.__cause__
+        return None, None
+
+    def is_retryable(self, error):
+        """Connection problems (including a stream cut mid-transfer), timeouts, throttling/server errors
+        and failed transfers are worth another try; local errors such as a full disk are not"""
+        status_code, _ = self.http_status(error)
+        if status_code is not None:
+            return status_code in self.retry_status_codes
+        return isinstance(error, (requests.ConnectionError, requests.Timeout,
+                                  requests.exceptions.ChunkedEncodingError, DownloadError))
+
+    def delay(self, attempt, retry_after=None):
+        """Seconds to wait before the next attempt"""
+        if retry_after:
+            return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def call(self, func, *args, description="Request", **kwargs):
+        """Call func, retrying retryable errors; the last error is raised"""
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                if attempt == self.max_attempts or not self.is_retryable(e):
+                    raise
+                wait = self.delay(attempt, self.http_status(e)[1])
+                if self.log:
+                    self.log(f"{description} failed ({str(e)}), retry {attempt}/{self.max_attempts - 1} in {wait:.0f}s")
+                time.sleep(wait)
+
+
+class TokenCache:
+    """Per-account Keycloak token cache with proactive background refresh"""
+
+    def __init__(self, token_url, client_id="cdse-public", refresh_margin=60, session=None, retry_policy=None):
+        self.token_url = token_url
+        self.session = session or requests.Session()
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.client_id = client_id
+        self.refresh_margin = refresh_margin  # Seconds before expiry at which a token is renewed
+        self.lock = threading.Lock()
+        self.account_locks = {}
+        self.tokens = {}  # username -> access/refresh tokens and their expiry times
+        self.timers = {}
+
+    def get(self, username, password):
+        """Get a valid access token for the account, requesting one only when needed"""
+        with self.account_lock(username):
+            entry = self.tokens.get(username)
+            now = time.time()
+            if entry and entry['expires_at'] - self.refresh_margin > now:
+                return entry['access_token']
+            if entry and entry['refresh_expires_at'] - self.refresh_margin > now:
+                try:
+                    return self.refresh(username)
+                except Exception:
+                    pass  # Fall back to a password grant
+            return self.store(username, self.request_token({
+                "client_id": self.client_id,
+                "username": username,
+                "password": password,
+                "grant_type": "password"
+            }))
+
+    def account_lock(self, username):
+        with self.lock:
+            return self.account_locks.setdefault(username, threading.Lock())
+
+    def request_token(self, data):
+        return self.retry_policy.call(self.post_token, data, description="Token request")
+
+    def post_token(self, data):
+        response = self.session.post(self.token_url, data=data)
+        response.raise_for_status()
+        return response.json()
+
+    def refresh(self, username):
+        """Renew the access token with grant_type=refresh_token (caller holds the account lock)"""
+        return self.store(username, self.request_token({
+            "client_id": self.client_id,
+            "refresh_token": self.tokens[username]['refresh_token'],
+            "grant_type": "refresh_token"
+        }))
+
+    def store(self, username, payload):
+        """Cache a token response and schedule its refresh shortly before it expires"""
+        now = time.time()
+        self.tokens[username] = {
+            'access_token': payload['access_token'],
+            'expires_at': now + payload.get('expires_in', 600),
+            'refresh_token': payload.get('refresh_token'),
+            'refresh_expires_at': now + payload.get('refresh_expires_in', 0) if payload.get('refresh_token') else 0
+        }
+        self.schedule_refresh(username, max(payload.get('expires_in', 600) - self.refresh_margin, 1))
+        return payload['access_token']
+
+    def schedule_refresh(self, username, delay):
+        with self.lock:
+            timer = self.timers.pop(username, None)
+            if timer:
+                timer.cancel()
+            timer = threading.Timer(delay, self.background_refresh, args=(username,))
+            timer.daemon = True
+            self.timers[username] = timer
+            timer.start()
+
+    def background_refresh(self, username):
+        """Timer callback: refresh while the refresh token is valid, else drop the entry"""
+        with self.account_lock(username):
+            entry = self.tokens.get(username)
+            if not entry:
+                return
+            if entry['refresh_expires_at'] - self.refresh_margin > time.time():
+                try:
+                    self.refresh(username)
+                    return
+                except Exception:
+                    pass
+            del self.tokens[username]  # Next get() does a fresh password grant
+
+    def invalidate(self, username):
+        """Forget an account's token after the server rejected it, so the next get() requests a new one"""
+        with self.account_lock(username):
+            self.tokens.pop(username, None)
+            with self.lock:
+                timer = self.timers.pop(username, None)
+            if timer:
+                timer.cancel()
+
+    def close(self):
+        """Stop all pending refresh timers"""
+        with self.lock:
+            for timer in self.timers.values():
+                timer.cancel()
+            self.timers.clear()
+
+
+class CredentialScheduler:
+    """Hands out the least-loaded healthy account and queues callers while every account is busy"""
+
+    def __init__(self, users, max_in_flight, cooldown=300):
+        self.users = users
+        self.max_in_flight = max_in_flight  # CDSE per-user concurrent download limit
+        self.cooldown = cooldown  # Base seconds an account rests after a 429/403
+        self.condition = threading.Condition()
+        self.state = {
+            user['email']: {'in_flight': 0, 'failures': 0, 'cooldown_until': 0.0, 'last_used': 0.0}
+            for user in users
+        }
+
+    def acquire(self, slots=1):
+        """Reserve `slots` connections on an account (one per parallel segment of a transfer),
+        waiting until one has that many free below its cap and is not cooling down.
+        Callers should not ask for more than max_in_flight slots."""
+        with self.condition:
+            while True:
+                now = time.time()
+                available = [user for user in self.users
+                             if self.state[user['email']]['in_flight'] + slots <= self.max_in_flight
+                             and self.state[user['email']]['cooldown_until'] <= now]
+                if available:
+                    user = min(available, key=lambda u: (self.state[u['email']]['in_flight'],
+                                                         self.state[u['email']]['failures'],
+                                                         self.state[u['email']]['last_used']))
+                    state = self.state[user['email']]
+                    state['in_flight'] += slots
+                    state['last_used'] = now
+                    return user['email'], user['password']
+                # Sleep until a transfer finishes or the first cooldown ends
+                cooling = [state['cooldown_until'] for state in self.state.values() if state['cooldown_until'] > now]
+                self.condition.wait(min(cooling) - now if cooling else None)
+
+    def release(self, username, status_code=None, retry_after=None, slots=1):
+        """Return the slots of a transfer, recording how the account's last request went"""
+        with self.condition:
+            self.state[username]['in_flight'] -= slots
+            self.record(username, status_code, retry_after)
+            self.condition.notify_all()
+
+    def record(self, username, status_code, retry_after=None):
+        """429/403 put the account on a growing cooldown (or the server's Retry-After), success clears it"""
+        state = self.state[username]
+        if status_code in (403, 429):
+            state['failures'] += 1
+            delay = retry_after or self.cooldown * min(2 ** (state['failures'] - 1), 8)
+            state['cooldown_until'] = time.time() + delay
+        elif status_code is not None and status_code < 400:
+            state['failures'] = 0
+
 
 class SentinelDownloader:
-    def __init__(self):
+    def __init__(self, regions=None):
         # Configuration
         self.date_option = 2  # 1 = Number of days from now, 2 = Start Day to End Day
         self.num_days = 10 
         self.end_day = datetime.datetime.now().date() # Date in Now as yyyy-mm-dd
-        self.start_day = datetime.datetime.strptime('2025-02-23', '%Y-%m-%d').date()
+        # start_day comes from the region profiles (earliest start of the selected regions)
         self.sep_days = 10
         self.max_cloud_coverage = 15  # Maximum c loud coverage percentage
         
@@ -32,34 +482,97 @@ class SentinelDownloader:
         self.main_directory = 'Sentinel_2' if self.satellite == 'Sentinel-2' else 'Sentinel_1'
         self.levels = ['MSIL2A'] # Sentinel-2 MSIL2A || MSIL1C
         self.small_file_size = 10240
+        self.download_attempts = 3  # Attempts per product, each one resumes the partial file
+        self.segmented_download = False  # Fetch a product over several parallel connections (byte ranges)
+        self.max_segments = 4  # Upper bound of connections per product
+        self.segment_size = 128 * 1024 * 1024  # Target bytes per segment, smaller products get fewer segments
+        self.journal_interval = 5  # Seconds between journal updates while segments are downloading
+        
+        # Concurrency
+        self.max_workers = 4  # Number of tiles searched/downloaded at the same time
+        self.max_downloads_per_account = 2  # Concurrent downloads allowed per CDSE account
+        self.account_cooldown = 300  # Seconds an account rests after a 429/403, doubled on repeats
+        
+        # Search configuration
+        self.sync_mode = 'full'  # 'full' = walk start_day to end_day, 'incremental' = only products published since the last run
+        self.search_mode = 'batched'  # 'batched' = one paged query per date range, 'tile' = one query per tile
+        self.page_size = 1000  # Products per catalogue page ($top), 1000 is the catalogue maximum
+        # Only the fields the downloader uses are requested ($select); set to None to get full records
+        self.select_fields = 'Id,Name,ContentDate,PublicationDate,Checksum,ContentLength'
+        self.nodata_weight = 1.0  # Weight of the nodata pixel percentage against cloud cover when ranking scenes
         
         # Area of interest and collection
-        self.aoi = "POLYGON((92.0 28.5,109.5 28.5,109.5 5.5,92.0 5.5,92.0 28.5))"  # Removed extra quote
         self.data_collection = "SENTINEL-2"
+        # Per-tile searches: 'tileId' = exact tile attribute filter, 'footprint' = the tile's own MGRS footprint.
+        # Batched searches always use the bounding box of the footprints of the tiles they look for.
+        self.tile_filter = 'tileId'
 
-        # Tiles to process
-        self.tiles = ['T47QLA', 'T47QLB', 'T47PMR', 'T47PMT', 'T47QQB', 'T48QTE', 
-                     'T48QTD', 'T47PMS', 'T47QNC', 'T48QTF', 'T47PRR', 'T48QVD',
-                     'T47QMC', 'T47QMU', 'T47PRQ', 'T48QVE', 'T47PNP', 'T47QQA', 
-                     'T48QUF', 'T47PNQ', 'T48PTC', 'T47PQS', 'T47PQT', 'T47PPT',
-                     'T47PPS', 'T47QQT', 'T47QQS', 'T47QPT', 'T47QPS', 'T48QYJ',
-                     'T48QYK', 'T47PQU', 'T47PPS', 'T47PPR', 'T48PTA', 'T47QRV', 
-                     'T47QPC', 'T47QNB', 'T47QPB', 'T47QPA', 'T47QLV', 'T48PTB',
-                     'T48PUB', 'T48PVB', 'T48PWB', 'T48PWC', 'T48PUC', 'T48PVC',
-                     'T47PNS']
+        # Regions to process; a tile shared by several regions is searched and downloaded once
+        self.regions = [region.upper() for region in (regions or ['THAILAND'])]
+        self.tile_regions = {}
+        self.tile_start_day = {}
+        for region in self.regions:
+            profile = REGION_PROFILES[region]
+            region_start = datetime.datetime.strptime(profile['start_day'], '%Y-%m-%d').date()
+            for tile in profile['tiles']:
+                tile_regions = self.tile_regions.setdefault(tile, [])
+                if region not in tile_regions:
+                    tile_regions.append(region)
+                self.tile_start_day[tile] = min(self.tile_start_day.get(tile, region_start), region_start)
+        self.tiles = list(self.tile_regions)
+        self.start_day = min(self.tile_start_day.values())
         
         # Initialize paths
         self.root_dir = Path(os.getcwd())
         self.log_dir = self.root_dir / 'download_log'
         self.data_dir = self.root_dir / self.main_directory
         
+        self.region_dirs = {region: self.root_dir / REGION_PROFILES[region]['directory']
+                            for region in self.regions if REGION_PROFILES[region].get('directory')}
+        
         # Create necessary directories
         self.log_dir.mkdir(exist_ok=True)
         self.data_dir.mkdir(exist_ok=True)
         
+        # Local catalogue of search results and download state
+        self.index = ProductIndex(self.data_dir / 'product_index.sqlite')
+        
+        # Keep-alive connection pools that live for the whole run, one per endpoint
+        self.sessions = {
+            'catalogue': self.create_session(self.max_workers),
+            'identity': self.create_session(len(self.users)),
+            'download': self.create_session(self.max_workers * self.max_segments)
+        }
+        
+        # Backoff for search, token and download calls; failed tile/range pairs are retried at the end
+        self.retry_policy = RetryPolicy(max_attempts=5, base_delay=2, max_delay=300, log=self.log_and_print)
+        self.retry_queue = []
+        self.permanent_failures = []  # Tile/range pairs whose error is not worth retrying
+        self.retry_rounds = 2
+        
+        # Access tokens shared by all downloads of an account
+        self.token_cache = TokenCache(
+            "https://identity.dataspace.copernicus.eu/auth/realms/CDSE/protocol/openid-connect/token",
+            session=self.sessions['identity'], retry_policy=self.retry_policy)
+        
         # Initialize download tracking
         self.downloaded_files = []
         self.logger = None
+        
+        # Shared state for concurrent workers
+        self.lock = threading.Lock()
+        self.credentials = CredentialScheduler(self.users, self.max_downloads_per_account, self.account_cooldown)
+        self.progress_positions = queue.Queue()
+        for position in range(self.max_workers):
+            self.progress_positions.put(position)
+
+    def create_session(self, pool_size):
+        """Create a session whose connection pool can keep pool_size connections per host alive"""
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(pool_size, 1))
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
 
     def setup_logging(self):
         """Setup logging file with timestamp"""
@@ -71,70 +584,183 @@ class SentinelDownloader:
         self.log_and_print('Script Download Sentinel-2 From Gistda Version 1.13')
         self.log_and_print(f"Starting time is: {datetime.datetime.now()}")
         self.log_and_print(f"Maximum cloud coverage set to: {self.max_cloud_coverage}%")
+        self.log_and_print(f"Regions: {', '.join(self.regions)} ({len(self.tiles)} unique tiles)")
 
     def search_sentinel_data(self, date_range, tile):
-        """Search for Sentinel data based on the given date range, tile, and cloud coverage"""
+        """Search for Sentinel data based on the given date range, tile, and cloud coverage.
+        Returns None when the search still fails after retries."""
         start_date, end_date = date_range
         try:
             # Construct the URL for the API query with cloud coverage filter
+            if self.tile_filter == 'tileId':
+                tile_clause = ("Attributes/OData.CSC.StringAttribute/any(att:att/Name eq 'tileId' and "
+                               f"att/OData.CSC.StringAttribute/Value eq '{tile.lstrip('T')}') and ")
+                aoi = None
+            else:
+                tile_clause = ""
+                aoi = self.footprint_wkt([tile])
             url = (f"https://catalogue.dataspace.copernicus.eu/odata/v1/Products?"
-                f"$filter=contains(Name,'{tile}') and "
-                f"Collection/Name eq '{self.data_collection}' and "
-                f"OData.CSC.Intersects(area=geography'SRID=4326;{self.aoi}') and "
-                f"ContentDate/Start gt {start_date}T00:00:00.000Z and "
-                f"ContentDate/Start lt {end_date}T00:00:00.000Z and "
-                f"Attributes/OData.CSC.DoubleAttribute/any(att:att/Name eq 'cloudCover' and att/Value lt {self.max_cloud_coverage})")  # Fixed cloud coverage filter syntax
+                f"$filter={tile_clause}"
+                f"{self.build_search_filter(date_range, aoi)}{self.query_options()}&$top={self.page_size}")
         
             # Get the response from the API
-            response = requests.get(url)
-            response.raise_for_status()
-            data = response.json()
+            data = self.retry_policy.call(self.get_json, url, description=f"Search {tile} {start_date} to {end_date}")
         
             # Extract the product information from the response
             products = []
-            for item in data['value'][:20]:  # Limit to 20 items
-                products.append([
-                    item['Id'],
-                    item['Name'],
-                    item['Checksum'],
-                    item['ContentLength']
-                ])
+            for item in data['value']:
+                product = self.product_from_item(item)
+                if product['tile'] == tile:  # Exact tile match, a footprint also touches neighbouring tiles
+                    products.append(product)
+            self.index.record_products(products)
             return products
         except Exception as e:
             self.log_and_print(f"Error searching data for {start_date} to {end_date}: {str(e)}")
-            time.sleep(120)
-            return []
+            return None
+
+    def search_sentinel_data_batch(self, date_range, tiles=None, published_after=None):
+        """Search all tiles for a date range with paged queries and group the products by tile.
+        published_after limits the search to products the catalogue published after that time.
+        Returns None if the search failed so the caller can fall back to per-tile searches."""
+        start_date, end_date = date_range
+        end_date = end_date or 'now'  # Open-ended incremental search, only used in messages
+        wanted_tiles = set(tiles if tiles is not None else self.tiles)
+        levels = ' or '.join(f"contains(Name,'{level}')" for level in self.levels)
+        search_filter = f"({levels}) and {self.build_search_filter(date_range, self.footprint_wkt(wanted_tiles))}"
+        if published_after:
+            search_filter += f" and PublicationDate gt {self.odata_datetime(published_after)}"
+        try:
+            url = "https://catalogue.dataspace.copernicus.eu/odata/v1/Products"
+            skip = 0
+            products_by_tile = {}
+            while url:
+                if skip is not None:
+                    page_url = f"{url}?$filter={search_filter}{self.query_options()}&$top={self.page_size}&$skip={skip}"
+                else:
+                    page_url = url  # nextLink already carries the query
+                data = self.retry_policy.call(self.get_json, page_url,
+                                              description=f"Batched search {start_date} to {end_date}")
+                
+                page_products = []
+                for item in data['value']:
+                    product = self.product_from_item(item)
+                    if product['tile'] in wanted_tiles:
+                        products_by_tile.setdefault(product['tile'], []).append(product)
+                        page_products.append(product)
+                if page_products:
+                    self.index.record_products(page_products)  # One transaction per page
+                
+                # Follow the server's paging link, otherwise page with $skip until a short page
+                next_link = data.get('@odata.nextLink')
+                if next_link:
+                    url, skip = next_link, None
+                elif skip is not None and len(data['value']) == self.page_size:
+                    skip += self.page_size
+                else:
+                    url = None
+            
+            found = sum(len(products) for products in products_by_tile.values())
+            self.log_and_print(f"Found {found} products for {len(products_by_tile)} tiles in {start_date} to {end_date}")
+            return products_by_tile
+        except Exception as e:
+            self.log_and_print(f"Error in batched search for {start_date} to {end_date}: {str(e)}")
+            return None
+
+    def query_options(self):
+        """OData options shared by all searches: attributes for ranking, a stable order for paging
+        and, when configured, only the fields the downloader needs"""
+        options = "&$expand=Attributes&$orderby=ContentDate/Start desc"
+        if self.select_fields:
+            options += f"&$select={self.select_fields}"
+        return options
+
+    def get_json(self, url):
+        """GET a catalogue URL and decode the JSON body"""
+        response = self.sessions['catalogue'].get(url)
+        response.raise_for_status()
+        return response.json()
+
+    def build_search_filter(self, date_range, aoi=None):
+        """Build the OData filter shared by the per-tile and batched searches.
+        An end date of None leaves the sensing date open-ended."""
+        start_date, end_date = date_range
+        area = f"OData.CSC.Intersects(area=geography'SRID=4326;{aoi}') and " if aoi else ""
+        before_end = f"ContentDate/Start lt {end_date}T00:00:00.000Z and " if end_date else ""
+        return (f"Collection/Name eq '{self.data_collection}' and "
+            f"{area}"
+            f"ContentDate/Start gt {start_date}T00:00:00.000Z and "
+            f"{before_end}"
+            f"Attributes/OData.CSC.DoubleAttribute/any(att:att/Name eq 'cloudCover' and att/Value lt {self.max_cloud_coverage})")  # Fixed cloud coverage filter syntax
+
+    def footprint_wkt(self, tiles):
+        """WKT polygon of one tile's footprint, or the bounding box of several tiles' footprints"""
+        corners = [corner for tile in tiles for corner in mgrs_tile_footprint(tile)]
+        if len(tiles) > 1:
+            west, east = min(c[0] for c in corners), max(c[0] for c in corners)
+            south, north = min(c[1] for c in corners), max(c[1] for c in corners)
+            corners = [(west, north), (east, north), (east, south), (west, south)]
+        ring = corners + corners[:1]
+        return "POLYGON((" + ",".join(f"{lon:.4f} {lat:.4f}" for lon, lat in ring) + "))"
+
+    def product_from_item(self, item):
+        """Convert a catalogue item into the product record used by the downloader and the index"""
+        attributes = {att['Name']: att.get('Value') for att in item.get('Attributes', [])}
+        return {
+            'id': item['Id'],
+            'name': item['Name'],
+            'tile': self.parse_tile(item['Name']),
+            'sensing_date': item.get('ContentDate', {}).get('Start'),
+            'publication_date': item.get('PublicationDate'),
+            'cloud_cover': attributes.get('cloudCover'),
+            'nodata': attributes.get('nodataPixelPercentage'),
+            'checksum': item.get('Checksum', []),
+            'content_length': item.get('ContentLength')
+        }
+
+    def odata_datetime(self, value):
+        """Format a catalogue timestamp (or date) as an OData datetime literal with milliseconds"""
+        value = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+        return value.strftime('%Y-%m-%dT%H:%M:%S.') + f"{value.microsecond // 1000:03d}Z"
+
+    def processing_baseline(self, product_name):
+        """Processing baseline from a product name as a number (N0511 -> 5.11), 0 if unknown"""
+        parts = product_name.split('_')
+        if len(parts) > 3 and parts[3].startswith('N') and parts[3][1:].isdigit():
+            return int(parts[3][1:]) / 100
+        return 0
+
+    def rank_products(self, products):
+        """Order candidates best first: lowest cloud + nodata score (whole percent), then the newest
+        processing baseline, then the latest sensing time"""
+        def score(product):
+            cloud = product['cloud_cover'] if product['cloud_cover'] is not None else 100
+            nodata = product.get('nodata') or 0
+            return round(cloud + self.nodata_weight * nodata), -self.processing_baseline(product['name'])
+        
+        latest_first = sorted(products, key=lambda p: p['sensing_date'] or '', reverse=True)
+        return sorted(latest_first, key=score)  # Stable, so equal scores keep the latest scene first
+
+    def parse_tile(self, product_name):
+        """Get the MGRS tile id (e.g. T47QLA) from a product name"""
+        # S2A_MSIL2A_20250223T034711_N0511_R104_T47QLA_20250223T073224.SAFE
+        parts = product_name.split('_')
+        return parts[5] if len(parts) > 5 else None
 
     # [Rest of the methods remain the same as in the original code]
     def log_and_print(self, message):
         """Helper method to both print and log a message"""
-        print(message)
-        if self.logger:
-            self.logger.write(f"{message}\n")
-            self.logger.flush()
-
-    def get_random_credentials(self):
-        """Get random user credentials"""
-        user = random.choice(self.users)
-        return user['email'], user['password']
+        with self.lock:
+            tqdm.write(message)  # Keeps parallel progress bars intact
+            if self.logger:
+                self.logger.write(f"{message}\n")
+                self.logger.flush()
 
     def get_keycloak_token(self, username: str, password: str) -> str:
-        """Get authentication token"""
-        data = {
-            "client_id": "cdse-public",
-            "username": username,
-            "password": password,
-            "grant_type": "password"
-        }
+        """Get authentication token, reusing the cached token of the account while it is valid"""
         try:
-            response = requests.post(
-                "https://identity.dataspace.copernicus.eu/auth/realms/CDSE/protocol/openid-connect/token",
-                data=data
-            )
-            response.raise_for_status()
-            return response.json()["access_token"]
+            return self.token_cache.get(username, password)
         except Exception as e:
-            raise Exception(f"Keycloak token creation failed: {str(e)}")
+            raise Exception(f"Keycloak token creation failed: {str(e)}") from e
 
     def calculate_date_ranges(self):
         """Calculate date ranges for search"""
@@ -159,48 +785,339 @@ class SentinelDownloader:
         return final_ranges
 
     def download_file(self, product, year_dir):
-        """Download a single file with progress display"""
+        """Download a single file with progress display.
+        Data is written to <name>.zip.part with a small .part.json journal so an interrupted
+        transfer resumes with an HTTP Range request; the zip is only renamed into place once
+        the full ContentLength has arrived.
+        Returns True when downloaded, False after a transient failure worth another round
+        and None after a permanent one (e.g. a full disk or a missing product)."""
+        product_id, product_name = product['id'], product['name']
+        filename = f"{product_name[:-5]}.zip"
+        file_path = year_dir / filename
+        part_path = year_dir / f"{filename}.part"
+        journal_path = year_dir / f"{filename}.part.json"
+        position = self.progress_positions.get()
+        # Every parallel segment is a connection on the account, so it takes a scheduler slot
+        slots = 1
+        if self.segmented_download:
+            slots = min(self.segment_count(product), self.credentials.max_in_flight)
+        self.index.set_status(product, 'downloading', file_path)
         try:
-            username, password = self.get_random_credentials()
-            token = self.get_keycloak_token(username, password)
-            
-            session = requests.Session()
-            session.headers.update({'Authorization': f'Bearer {token}'})
+            for attempt in range(1, self.download_attempts + 1):
+                # Every attempt asks the scheduler again, so a throttled account is swapped out
+                username, password = self.credentials.acquire(slots)
+                try:
+                    if slots > 1:
+                        try:
+                            self.download_segmented(product, part_path, journal_path, username, password,
+                                                    position, slots)
+                        except RangeNotSupported:
+                            # No byte ranges on this server: one plain stream, now and on later attempts
+                            self.log_and_print(f"Byte ranges not supported for {product_name}, "
+                                               f"downloading in one stream")
+                            self.credentials.release(username, slots=slots - 1)
+                            slots = 1
+                            self.download_part(product, part_path, journal_path, username, password, position)
+                    else:
+                        self.download_part(product, part_path, journal_path, username, password, position)
+                    os.replace(part_path, file_path)
+                    journal_path.unlink(missing_ok=True)
+                    self.credentials.release(username, 200, slots=slots)
+                    break
+                except Exception as e:
+                    status_code, retry_after = self.retry_policy.http_status(e)
+                    if status_code == 401:
+                        self.token_cache.invalidate(username)  # Rejected token, the account gets a new one
+                    self.credentials.release(username, status_code, retry_after, slots)
+                    resume_from = part_path.stat().st_size if part_path.exists() else 0
+                    self.log_and_print(f"Error downloading {product_name} (attempt {attempt}/{self.download_attempts}, "
+                                       f"{resume_from} bytes kept): {str(e)}")
+                    # 401/403 are account problems; the next attempt runs on another account
+                    retryable = self.retry_policy.is_retryable(e) or status_code in (401, 403)
+                    if attempt == self.download_attempts or not retryable:
+                        raise
+                    # Retry-After is handled by the account cooldown, so only back off here
+                    time.sleep(self.retry_policy.delay(attempt))
             
-            product_id, product_name, checksum, content_length = product
-            filename = f"{product_name[:-5]}.zip"
-            file_path = year_dir / filename
-            url = f'https://catalogue.dataspace.copernicus.eu/odata/v1/Products({product_id})/$value'
-            
-            response = session.get(url, allow_redirects=False)
-            while response.status_code in (301, 302, 303, 307):
-                url = response.headers['Location']
-                response = session.get(url, allow_redirects=False)
-            response = session.get(url, verify=False, stream=True)
-            response.raise_for_status()
-            
-            with open(file_path, 'wb') as f:
-                total_size = int(response.headers.get('content-length', 0))
-                progress = tqdm(total=total_size, unit='iB', unit_scale=True, desc=filename)
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-                        progress.update(len(chunk))
-                progress.close()
-            
-            self.downloaded_files.append(filename)
+            with self.lock:
+                self.downloaded_files.append(product)
+            self.index.set_status(product, 'downloaded', file_path)
             self.log_and_print(f"Download completed: {filename}")
             return True
             
         except Exception as e:
+            # The .part file and its journal are kept so the next run resumes instead of starting over
             self.log_and_print(f"Error downloading {product_name}: {str(e)}")
-            if file_path.exists():
-                file_path.unlink()
-            return False
+            self.index.set_status(product, 'failed')
+            status_code, _ = self.retry_policy.http_status(e)
+            if self.retry_policy.is_retryable(e) or status_code in (401, 403):
+                return False
+            return None
+        finally:
+            self.progress_positions.put(position)
+
+    def read_journal(self, product, part_path, journal_path):
+        """Return the journal of a partial file belonging to this product, else clear the partial file"""
+        if part_path.exists() and journal_path.exists():
+            try:
+                journal = json.loads(journal_path.read_text())
+                if journal.get('id') == product['id']:
+                    return journal
+            except (ValueError, OSError):
+                pass
+        part_path.unlink(missing_ok=True)
+        journal_path.unlink(missing_ok=True)
+        return None
+
+    def write_journal(self, product, journal_path, content_length, validator, segments=None):
+        """Record what a .part file belongs to so it is only resumed against the same product"""
+        journal = {
+            'id': product['id'],
+            'name': product['name'],
+            'content_length': content_length,
+            'validator': validator,
+            'updated_at': datetime.datetime.now().isoformat()
+        }
+        if segments is not None:
+            journal['segments'] = segments
+        # Written aside and renamed, so a kill mid-write never leaves a truncated journal
+        temp_path = journal_path.with_name(journal_path.name + '.tmp')
+        temp_path.write_text(json.dumps(journal))
+        os.replace(temp_path, journal_path)
+
+    def open_download(self, auth, product_id, headers=None):
+        """Follow the catalogue redirects to the zipper URL and return its streamed response.
+        Every hop is streamed and carries the caller's headers (Range, If-Range), so the request that
+        reaches the zipper is the transfer itself and no body is read before the caller decides how."""
+        session = self.sessions['download']
+        url = f'https://catalogue.dataspace.copernicus.eu/odata/v1/Products({product_id})/$value'
+        headers = dict(auth, **(headers or {}))
+        
+        response = session.get(url, headers=headers, allow_redirects=False, verify=False, stream=True)
+        while response.status_code in (301, 302, 303, 307):
+            url = response.headers['Location']
+            response.close()
+            response = session.get(url, headers=headers, allow_redirects=False, verify=False, stream=True)
+        return response
+
+    def download_part(self, product, part_path, journal_path, username, password, position):
+        """Download (or resume) a product into its .part file"""
+        journal = self.read_journal(product, part_path, journal_path)
+        offset, validator = 0, None
+        content_length = product.get('content_length')
+        if journal and 'segments' not in journal:
+            offset, validator = part_path.stat().st_size, journal.get('validator')
+            if content_length and offset > content_length:
+                offset = 0
+        elif journal:
+            part_path.unlink()  # Preallocated by a segmented download, its size says nothing
+        if content_length and offset == content_length:
+            checksum = self.checksum_hasher(product)
+            if checksum:
+                self.hash_file(checksum[2], part_path, offset)
+                self.check_checksum(product, checksum, part_path, journal_path)
+            return  # Completed earlier, only the rename was missing
+        
+        token = self.get_keycloak_token(username, password)
+        auth = {'Authorization': f'Bearer {token}'}
+        
+        # Resume on the redirected zipper URL; If-Range makes the server send the whole file if it changed
+        headers = {}
+        if offset:
+            headers['Range'] = f'bytes={offset}-'
+            if validator:
+                headers['If-Range'] = validator
+        response = self.open_download(auth, product['id'], headers)
+        try:
+            self.stream_part(product, part_path, journal_path, response, offset, validator, position)
+        finally:
+            response.close()  # Hands the connection back to the pool
+
+    def stream_part(self, product, part_path, journal_path, response, offset, validator, position):
+        """Write a (possibly ranged) response into the .part file and check it against the catalogue"""
+        content_length = product.get('content_length')
+        response.raise_for_status()
+        if offset and response.status_code != 206:
+            offset = 0  # Range not honoured, start over
+        
+        if not content_length:
+            content_length = offset + int(response.headers.get('content-length', 0))
+        validator = response.headers.get('ETag') or response.headers.get('Last-Modified') or validator
+        self.write_journal(product, journal_path, content_length, validator)
+        
+        # The checksum is computed as chunks stream in; only a resumed prefix is read back once
+        checksum = self.checksum_hasher(product)
+        if checksum and offset:
+            self.hash_file(checksum[2], part_path, offset)
+        
+        with open(part_path, 'ab' if offset else 'wb') as f:
+            progress = tqdm(total=content_length, initial=offset, unit='iB', unit_scale=True,
+                            desc=part_path.name[:-5], position=position, leave=False)
+            for chunk in response.iter_content(chunk_size=8192):
+                if chunk:
+                    f.write(chunk)
+                    if checksum:
+                        checksum[2].update(chunk)
+                    progress.update(len(chunk))
+            progress.close()
+        
+        size = part_path.stat().st_size
+        if content_length and size > content_length:
+            part_path.unlink()
+            journal_path.unlink(missing_ok=True)
+            raise DownloadError(f"Download overran ContentLength ({size} of {content_length} bytes), restarting")
+        if content_length and size != content_length:
+            raise DownloadError(f"Incomplete download: {size} of {content_length} bytes")
+        if checksum:
+            self.check_checksum(product, checksum, part_path, journal_path)
+
+    def segment_count(self, product):
+        """Number of byte ranges to split a product into, based on its ContentLength"""
+        content_length = product.get('content_length') or 0
+        segments = -(-content_length // self.segment_size)  # Ceiling division
+        return max(1, min(self.max_segments, segments))
+
+    def download_segmented(self, product, part_path, journal_path, username, password, position, connections):
+        """Download a product as parallel byte ranges written in place into a preallocated .part file,
+        over at most `connections` simultaneous connections (the scheduler slots held for it).
+        Progress per segment is journaled before the first byte and every journal_interval seconds,
+        so an interrupted segmented download also resumes."""
+        content_length = product['content_length']
+        journal = self.read_journal(product, part_path, journal_path)
+        if journal and journal.get('segments') and part_path.stat().st_size == content_length:
+            segments = journal['segments']
+            validator = journal.get('validator')
+        else:
+            # [start, end (inclusive), bytes done] per segment
+            count = min(self.segment_count(product), connections)
+            length = -(-content_length // count)
+            segments = [[start, min(start + length, content_length) - 1, 0]
+                        for start in range(0, content_length, length)]
+            validator = None
+            with open(part_path, 'wb') as f:
+                f.truncate(content_length)  # Preallocate so every segment writes at its own offset
+            self.write_journal(product, journal_path, content_length, validator, segments)
+        
+        token = self.get_keycloak_token(username, password)
+        
+        session = self.sessions['download']
+        auth = {'Authorization': f'Bearer {token}'}
+        # One-byte probe: gives the zipper URL the segments are fetched from and shows whether the
+        # server honours byte ranges. Streamed, so closing it reads none of a full response.
+        response = self.open_download(auth, product['id'], {'Range': 'bytes=0-0'})
+        try:
+            response.raise_for_status()
+            url = response.url
+            ranges_supported = response.status_code == 206
+        finally:
+            response.close()
+        if not ranges_supported:
+            raise RangeNotSupported(f"Server ignored the byte range request for {product['name']}")
+        
+        progress_lock = threading.Lock()
+        progress = tqdm(total=content_length, initial=sum(segment[2] for segment in segments),
+                        unit='iB', unit_scale=True, desc=part_path.name[:-5], position=position, leave=False)
+        # Shared between the segment threads, guarded by progress_lock
+        state = {'validator': validator, 'saved_at': time.monotonic(), 'changed': False}
+        
+        def save_journal():
+            self.write_journal(product, journal_path, content_length, state['validator'],
+                               [list(segment) for segment in segments])
+            state['saved_at'] = time.monotonic()
+        
+        def fetch(segment):
+            start, end, done = segment
+            if start + done > end:
+                return
+            headers = dict(auth, Range=f'bytes={start + done}-{end}')
+            with progress_lock:
+                sent_validator = state['validator']
+            if sent_validator:
+                headers['If-Range'] = sent_validator
+            with session.get(url, headers=headers, verify=False, stream=True) as response, \
+                    open(part_path, 'r+b') as f:
+                response.raise_for_status()
+                if response.status_code != 206:
+                    if sent_validator:
+                        state['changed'] = True  # If-Range failed: the product changed since the journal
+                        raise DownloadError("Product changed on the server, restarting the download")
+                    raise RangeNotSupported("Server did not honour the byte range request")
+                with progress_lock:
+                    if not state['validator']:
+                        state['validator'] = response.headers.get('ETag') or response.headers.get('Last-Modified')
+                        save_journal()
+                # Each segment writes through its own handle at its own offset, no assembly copy needed
+                f.seek(start + done)
+                for chunk in response.iter_content(chunk_size=1024 * 1024):
+                    if chunk:
+                        f.write(chunk)
+                        f.flush()  # Journaled bytes must already be in the file
+                        with progress_lock:
+                            segment[2] += len(chunk)
+                            progress.update(len(chunk))
+                            if time.monotonic() - state['saved_at'] >= self.journal_interval:
+                                save_journal()
+        
+        try:
+            # A resumed journal may hold more segments than slots; the extra ones wait their turn
+            with ThreadPoolExecutor(max_workers=min(len(segments), connections)) as executor:
+                for future in [executor.submit(fetch, segment) for segment in segments]:
+                    future.result()
+        finally:
+            progress.close()
+            if state['changed']:
+                part_path.unlink(missing_ok=True)
+                journal_path.unlink(missing_ok=True)
+            else:
+                with progress_lock:
+                    save_journal()
+        
+        missing = sum(end - start + 1 - done for start, end, done in segments)
+        if missing:
+            raise DownloadError(f"Incomplete segmented download: {missing} bytes missing")
+        
+        # Segments arrive out of order, so the digest is taken over the finished file
+        checksum = self.checksum_hasher(product)
+        if checksum:
+            self.hash_file(checksum[2], part_path, content_length)
+            self.check_checksum(product, checksum, part_path, journal_path)
+
+    def checksum_hasher(self, product):
+        """Pick a hasher for a checksum the catalogue provides.
+        Returns (algorithm, expected value, hasher), or None when there is nothing to check against."""
+        checksums = {c.get('Algorithm', '').upper(): c.get('Value') for c in product.get('checksum') or []}
+        if blake3 is not None and checksums.get('BLAKE3'):
+            return 'BLAKE3', checksums['BLAKE3'], blake3()
+        if checksums.get('MD5'):
+            return 'MD5', checksums['MD5'], hashlib.md5()
+        return None
+
+    def hash_file(self, hasher, file_path, length):
+        """Feed the first length bytes of a file to a hasher"""
+        with open(file_path, 'rb') as f:
+            while length > 0:
+                chunk = f.read(min(length, 1024 * 1024))
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                length -= len(chunk)
+
+    def check_checksum(self, product, checksum, part_path, journal_path):
+        """Compare a computed digest with the catalogue value; a mismatch discards the partial file"""
+        algorithm, expected, hasher = checksum
+        if hasher.hexdigest().lower() != expected.lower():
+            part_path.unlink(missing_ok=True)
+            journal_path.unlink(missing_ok=True)
+            self.index.set_status(product, 'checksum_mismatch')
+            raise DownloadError(f"{algorithm} checksum mismatch for {product['name']}")
+        product['checksum_verified'] = algorithm
 
     def verify_downloads(self):
         """Verify all downloaded files"""
-        for filename in self.downloaded_files:
+        for product in self.downloaded_files:
+            if product.get('checksum_verified'):
+                continue  # Already checked against the catalogue checksum while downloading
+            filename = f"{product['name'][:-5]}.zip"
             year = filename[11:15]
             year_dir = self.data_dir / year
             file_path = year_dir / filename
@@ -212,50 +1129,260 @@ class SentinelDownloader:
                 if not zipfile.is_zipfile(file_path):
                     self.log_and_print(f"Corrupt zip file, removing: {filename}")
                     file_path.unlink()
+                    self.index.set_status(product, 'corrupt')
             except Exception as e:
                 self.log_and_print(f"Error verifying {filename}: {str(e)}")
                 if file_path.exists():
                     file_path.unlink()
+                self.index.set_status(product, 'corrupt')
+
+    def indexed_download(self, tile, date_range):
+        """Get the index row of a product already downloaded for the tile and range, if it is still on disk"""
+        row = self.index.downloaded_product(tile, date_range)
+        if row and row['local_path'] and Path(row['local_path']).exists():
+            return row
+        return None
+
+    def process_tile(self, date_range, tile, tiles_downloaded_in_range, products=None):
+        """Search and download the product for one tile in one date range (runs in a worker thread).
+        Products from a batched search can be passed in to skip the per-tile search."""
+        with self.lock:
+            if tile in tiles_downloaded_in_range:
+                return
+        
+        # Incremental runs: a tile already downloaded for this range needs no search at all
+        indexed = self.indexed_download(tile, date_range)
+        if indexed:
+            self.log_and_print(f"Tile {tile} already indexed: {Path(indexed['local_path']).name}")
+            self.place_in_regions(tile, Path(indexed['local_path']))
+            with self.lock:
+                tiles_downloaded_in_range.add(tile)
+            return
+        
+        if products is None:
+            products = self.search_sentinel_data(date_range, tile)
+            if products is None:
+                self.queue_retry(date_range, tile, tiles_downloaded_in_range)
+                return
+        products = [p for p in products if any(level in p['name'] for level in self.levels)]
+        
+        if products:
+            # Every candidate is scored; the order the catalogue returned them in means nothing
+            product = self.rank_products(products)[0]
+            self.log_and_print(f"Tile {tile}: selected {product['name']} (cloud {product['cloud_cover']}%) "
+                               f"from {len(products)} candidates")
+            year = product['name'][11:15]
+            year_dir = self.data_dir / year
+            year_dir.mkdir(exist_ok=True)
+            
+            filename = f"{product['name'][:-5]}.zip"
+            file_path = year_dir / filename
+            
+            if file_path.exists():
+                # Files from before the index existed are checked once, then recorded
+                if zipfile.is_zipfile(file_path):
+                    self.log_and_print(f"Tile {tile} already exists: {filename}")
+                    self.index.set_status(product, 'downloaded', file_path)
+                    self.place_in_regions(tile, file_path)
+                    with self.lock:
+                        tiles_downloaded_in_range.add(tile)
+                    return
+                else:
+                    file_path.unlink()
+            
+            downloaded = self.download_file(product, year_dir)
+            if downloaded:
+                with self.lock:
+                    tiles_downloaded_in_range.add(tile)
+                self.log_and_print(f"Downloaded tile {tile}: {filename}")
+                self.place_in_regions(tile, file_path)
+            elif downloaded is False:
+                self.queue_retry(date_range, tile, tiles_downloaded_in_range)
+            else:
+                self.log_and_print(f"Tile {tile}: not retried, the error is not transient")
+                with self.lock:
+                    self.permanent_failures.append((date_range, tile, tiles_downloaded_in_range))
+
+    def place_in_regions(self, tile, file_path):
+        """Hard-link (or copy across filesystems) a product into every region folder that needs the tile"""
+        for region in self.tile_regions.get(tile, []):
+            region_dir = self.region_dirs.get(region)
+            if region_dir is None:
+                continue  # The region uses the shared data directory
+            target = region_dir / file_path.parent.name / file_path.name
+            if target.exists():
+                continue
+            target.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                os.link(file_path, target)
+            except OSError:
+                shutil.copy2(file_path, target)
+            self.log_and_print(f"Placed {file_path.name} in region {region}")
+
+    def queue_retry(self, date_range, tile, tiles_downloaded_in_range):
+        """Remember a failed tile/range pair so it is retried at the end of the run instead of dropped"""
+        with self.lock:
+            self.retry_queue.append((date_range, tile, tiles_downloaded_in_range))
+
+    def wait_for(self, futures):
+        """Wait for worker futures, logging errors that escaped process_tile"""
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                self.log_and_print(f"Error processing tile: {str(e)}")
+
+    def drain_retry_queue(self, executor):
+        """Retry the tile/range pairs that failed during the run, a few rounds with backoff in between"""
+        for round_number in range(1, self.retry_rounds + 1):
+            with self.lock:
+                pending, self.retry_queue = self.retry_queue, []
+            if not pending:
+                break
+            wait = self.retry_policy.delay(round_number + 2)
+            self.log_and_print(f"Retry round {round_number}: {len(pending)} tile/range pairs in {wait:.0f}s")
+            time.sleep(wait)
+            self.wait_for([executor.submit(self.process_tile, date_range, tile, tiles_downloaded_in_range)
+                           for date_range, tile, tiles_downloaded_in_range in pending])
+        
+        with self.lock:
+            failed, self.retry_queue = self.retry_queue, []
+            permanent, self.permanent_failures = self.permanent_failures, []
+        for date_range, tile, _ in failed:
+            self.log_and_print(f"Giving up on tile {tile} in range {date_range} after {self.retry_rounds} retry rounds")
+        # Errors that were not retried still count as failures, e.g. for the incremental high-water marks
+        return failed + permanent
+
+    def submit_full(self, executor, tiles, date_ranges):
+        """Search every date range from start_day to end_day and queue the tiles for download"""
+        ranges = []
+        futures = []
+        for date_range in date_ranges:
+            self.log_and_print(f"Processing date range: {date_range[0]} to {date_range[1]}")
+            tiles_downloaded_in_range = set()
+            
+            # One paged search for the tiles still missing; None falls back to a search per tile
+            products_by_tile = None
+            # Tiles only join the ranges from their region's start day onwards
+            range_tiles = [tile for tile in tiles
+                           if self.tile_start_day[tile].strftime("%Y-%m-%d") < date_range[1]]
+            missing_tiles = [tile for tile in range_tiles if not self.indexed_download(tile, date_range)]
+            if self.search_mode == 'batched' and missing_tiles:
+                products_by_tile = self.search_sentinel_data_batch(date_range, missing_tiles)
+            
+            for tile in range_tiles:
+                products = products_by_tile.get(tile, []) if products_by_tile is not None else None
+                futures.append(executor.submit(self.process_tile, date_range, tile,
+                                               tiles_downloaded_in_range, products))
+            ranges.append((date_range, range_tiles, tiles_downloaded_in_range))
+        return ranges, futures
+
+    def submit_incremental(self, executor, tiles, date_ranges):
+        """Ask the catalogue only for products published after each tile's high-water mark and queue
+        them by date range. Returns the ranges, futures and the PublicationDate reached per tile,
+        or None when the search failed."""
+        since = {}
+        for tile in tiles:
+            high_water = self.index.high_water(tile)
+            since[tile] = high_water or self.tile_start_day[tile].strftime("%Y-%m-%d")
+        oldest = min(since.values(), key=self.odata_datetime)
+        # No upper sensing bound: a product sensed after end_day must be seen, or a newer publication
+        # on its tile would move the mark past it
+        open_range = [self.start_day.strftime("%Y-%m-%d"), None]
+        end_date = self.end_day.strftime("%Y-%m-%d")
+        self.log_and_print(f"Incremental sync: products published after {oldest}")
+        
+        searched_at = self.odata_datetime(datetime.datetime.now(datetime.timezone.utc).isoformat())
+        products_by_tile = self.search_sentinel_data_batch(open_range, tiles, published_after=oldest)
+        if products_by_tile is None:
+            return None
+        
+        # Products published after each tile's own mark. A tile's mark only moves to the newest
+        # publication among its own products, never past the search time, and stops just before
+        # any product sensed after end_day (not queued this run). Tiles with nothing new keep their mark.
+        new_by_tile = {}
+        reached = {}
+        for tile, products in products_by_tile.items():
+            mark = self.odata_datetime(since[tile])
+            new_products = [p for p in products
+                            if p['publication_date'] and self.odata_datetime(p['publication_date']) > mark]
+            if not new_products:
+                continue
+            queued = [p for p in new_products if p['sensing_date'] and p['sensing_date'] < end_date]
+            later = [p for p in new_products if p not in queued]
+            if queued:
+                new_by_tile[tile] = queued
+            
+            high_water = min(max(self.odata_datetime(p['publication_date']) for p in new_products), searched_at)
+            if later:
+                first_later = min(self.odata_datetime(p['publication_date']) for p in later)
+                just_before = datetime.datetime.fromisoformat(first_later.replace('Z', '+00:00')) \
+                    - timedelta(milliseconds=1)
+                high_water = min(high_water, self.odata_datetime(just_before.isoformat()))
+            if high_water > mark:
+                reached[tile] = high_water
+        
+        # Queue the date ranges that gained a product, with every candidate the search returned for them
+        ranges = []
+        futures = []
+        for date_range in date_ranges:
+            range_tiles = []
+            tiles_downloaded_in_range = set()
+            for tile, new_products in new_by_tile.items():
+                if self.tile_start_day[tile].strftime("%Y-%m-%d") >= date_range[1]:
+                    continue
+                if not any(self.in_date_range(p, date_range) for p in new_products):
+                    continue
+                products = [p for p in products_by_tile[tile] if self.in_date_range(p, date_range)]
+                range_tiles.append(tile)
+                futures.append(executor.submit(self.process_tile, date_range, tile,
+                                               tiles_downloaded_in_range, products))
+            if range_tiles:
+                ranges.append((date_range, range_tiles, tiles_downloaded_in_range))
+        self.log_and_print(f"Incremental sync: {len(futures)} tile/range pairs with new products")
+        return ranges, futures, reached
+
+    def in_date_range(self, product, date_range):
+        """Whether a product was sensed inside a date range (same bounds as the catalogue search)"""
+        return bool(product['sensing_date']) and date_range[0] < product['sensing_date'] < date_range[1]
+
+    def advance_high_water(self, reached, failed):
+        """Store the PublicationDate reached per tile, except for tiles that still have failures"""
+        failed_tiles = {tile for _, tile, _ in failed}
+        for tile, high_water in reached.items():
+            if tile not in failed_tiles:
+                self.index.set_high_water(tile, high_water)
 
     def run(self):
         """Main execution method"""
         try:
             self.setup_logging()
             date_ranges = self.calculate_date_ranges()
+            tiles = list(dict.fromkeys(self.tiles))  # Drop duplicate tiles so two workers never race on one
+            self.log_and_print(f"Processing {len(tiles)} tiles with {self.max_workers} workers")
             
-            for date_range in date_ranges:
-                self.log_and_print(f"Processing date range: {date_range[0]} to {date_range[1]}")
-                tiles_downloaded_in_range = set()
-                
-                for tile in self.tiles:
-                    if tile in tiles_downloaded_in_range:
-                        continue
-                    
-                    products = self.search_sentinel_data(date_range, tile)
-                    products = [p for p in products if any(level in p[1] for level in self.levels)]
-                    
-                    if products:
-                        product = products[0]
-                        year = product[1][11:15]
-                        year_dir = self.data_dir / year
-                        year_dir.mkdir(exist_ok=True)
-                        
-                        filename = f"{product[1][:-5]}.zip"
-                        file_path = year_dir / filename
-                        
-                        if file_path.exists():
-                            if zipfile.is_zipfile(file_path):
-                                self.log_and_print(f"Tile {tile} already exists: {filename}")
-                                tiles_downloaded_in_range.add(tile)
-                                continue
-                            else:
-                                file_path.unlink()
-                        
-                        if self.download_file(product, year_dir):
-                            tiles_downloaded_in_range.add(tile)
-                            self.log_and_print(f"Downloaded tile {tile}: {filename}")
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                incremental = None
+                if self.sync_mode == 'incremental':
+                    incremental = self.submit_incremental(executor, tiles, date_ranges)
+                    if incremental is None:
+                        self.log_and_print("Incremental search failed, falling back to a full sync")
+                if incremental:
+                    ranges, futures, reached = incremental
+                else:
+                    ranges, futures = self.submit_full(executor, tiles, date_ranges)
                 
+                self.wait_for(futures)
+                failed = self.drain_retry_queue(executor)
+            
+            if incremental:
+                self.advance_high_water(reached, failed)
+            
+            for date_range, range_tiles, tiles_downloaded_in_range in ranges:
                 self.log_and_print(f"Tiles downloaded in range {date_range}: {tiles_downloaded_in_range}")
+                missing_tiles = self.index.missing_tiles(range_tiles, date_range)
+                if missing_tiles:
+                    self.log_and_print(f"Tiles still missing in range {date_range}: {missing_tiles}")
             
             self.verify_downloads()
             self.log_and_print("Download process completed successfully")
@@ -264,9 +1391,14 @@ class SentinelDownloader:
         except Exception as e:
             self.log_and_print(f"Critical error in download process: {str(e)}")
         finally:
+            self.token_cache.close()
+            for session in self.sessions.values():
+                session.close()
+            self.index.close()
             if self.logger:
                 self.logger.close()
 
 if __name__ == "__main__":
-    downloader = SentinelDownloader()
+    # Region names can be given on the command line, e.g. THAILAND MYANMAR LAO
+    downloader = SentinelDownloader(regions=sys.argv[1:] or None)
     downloader.run()
\ No newline at end of file
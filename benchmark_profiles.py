@@ -0,0 +1,85 @@
+import os
+import sys
+import time
+import tempfile
+from pathlib import Path
+from osgeo import gdal
+from extract_zips import scan_inventory
+from raster_processing import OUTPUT_PROFILES, creation_options, resolve_profile, logger
+
+def load_sample(granule_folder, window_size=2048, target_resolution=10):
+    """
+    Decode the bands of one granule (SCL excluded) into an in-memory stack at the target resolution,
+    so the profiles are timed on encoding only. window_size crops the top-left corner (0 = full granule).
+    """
+    band_files = sorted(str(path) for path in Path(granule_folder).glob('*.jp2') if 'SCL' not in path.name)
+    if not band_files:
+        raise ValueError(f"No JP2 band files in {granule_folder}")
+
+    vrt_options = gdal.BuildVRTOptions(
+        separate=True,
+        xRes=target_resolution,
+        yRes=target_resolution,
+        resampleAlg='nearest'
+    )
+    vrt_ds = gdal.BuildVRT('', band_files, options=vrt_options)
+
+    translate_kwargs = {'format': 'MEM'}
+    if window_size:
+        translate_kwargs['srcWin'] = [0, 0, min(window_size, vrt_ds.RasterXSize), min(window_size, vrt_ds.RasterYSize)]
+    sample_ds = gdal.Translate('', vrt_ds, options=gdal.TranslateOptions(**translate_kwargs))
+    vrt_ds = None
+    return sample_ds
+
+def benchmark_profiles(sample_ds, profiles=None):
+    """
+    Encode sample_ds to a GeoTIFF with every profile (OUTPUT_PROFILES names or profile dicts)
+    and return (label, seconds, bytes) rows.
+    """
+    results = []
+    with tempfile.TemporaryDirectory(prefix='profile_benchmark_') as temp_folder:
+        for number, profile in enumerate(profiles or OUTPUT_PROFILES, start=1):
+            if isinstance(profile, str):
+                label = profile
+            else:
+                settings = resolve_profile(profile)
+                label = f"custom{number}_{settings['compress']}".lower()
+            output_path = os.path.join(temp_folder, f"{label}.tif")
+            translate_options = gdal.TranslateOptions(
+                format='GTiff',
+                creationOptions=creation_options(profile, bigtiff=True)
+            )
+            start = time.perf_counter()
+            gdal.Translate(destName=output_path, srcDS=sample_ds, options=translate_options)
+            elapsed = time.perf_counter() - start
+            results.append((label, elapsed, os.path.getsize(output_path)))
+    return results
+
+def main():
+    """
+    Usage: python benchmark_profiles.py [granule_folder] [window_size]
+    Without a folder the first granule in SN2_Extract is used.
+    """
+    gdal.UseExceptions()
+
+    if len(sys.argv) > 1:
+        granule_folder = sys.argv[1]
+    else:
+        jp2_dirs = sorted(scan_inventory(Path.cwd() / 'SN2_Extract')['jp2_dirs'])
+        if not jp2_dirs:
+            logger.error("No granule folders found in SN2_Extract; pass a granule folder as the first argument.")
+            sys.exit(1)
+        granule_folder = jp2_dirs[0]
+    window_size = int(sys.argv[2]) if len(sys.argv) > 2 else 2048
+
+    logger.info(f"Benchmarking output profiles on {granule_folder} (window: {window_size or 'full granule'})")
+    sample_ds = load_sample(granule_folder, window_size)
+    raw_bytes = (sample_ds.RasterXSize * sample_ds.RasterYSize * sample_ds.RasterCount
+                 * gdal.GetDataTypeSize(sample_ds.GetRasterBand(1).DataType) // 8)
+
+    print(f"{'profile':<10}{'encode s':>10}{'size MB':>10}{'ratio':>8}")
+    for label, elapsed, size in benchmark_profiles(sample_ds):
+        print(f"{label:<10}{elapsed:>10.2f}{size / 1024 / 1024:>10.1f}{raw_bytes / size:>8.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,12 @@ import os
 import zipfile
 import shutil
 import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+try:
+    import fcntl  # POSIX only, used for reflinks
+except ImportError:
+    fcntl = None
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, 
@@ -10,38 +16,104 @@ logging.basicConfig(level=logging.INFO,
                         logging.StreamHandler()
                     ]) # Add more handlers as needed
 
-def extract_zips(root_folder):
+def extract_zip(zip_path, extract_folder):
+    """
+    Extract a single zip file into a temporary folder and rename it into place when complete,
+    so a crash never leaves a half-extracted folder under the final name.
+    """
+    partial_folder = extract_folder + '.partial'
+    if os.path.exists(partial_folder):
+        shutil.rmtree(partial_folder)  # Left behind by an interrupted run
+
+    os.makedirs(partial_folder)
+    try:
+        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+            zip_ref.extractall(partial_folder)
+        os.rename(partial_folder, extract_folder)
+    except BaseException:
+        shutil.rmtree(partial_folder, ignore_errors=True)
+        raise
+    return extract_folder
+
+# Directories that never hold band rasters; the scan does not descend into them
+PRUNED_DIRS = {'QI_DATA', 'AUX_DATA', 'HTML', 'DATASTRIP', 'rep_info'}
+
+def scan_inventory(root_folder):
+    """
+    Walk root_folder once with os.scandir and return an inventory shared by every stage:
+    'jp2_dirs' maps each directory holding JP2 files to their sorted file names
+    (SAFE IMG_DATA/R10m folders or SN2_Extract granule folders), 'zip_files' lists the zip paths.
+    PRUNED_DIRS and unfinished .partial extractions are skipped.
+    """
+    inventory = {'jp2_dirs': {}, 'zip_files': []}
+    stack = [os.path.abspath(root_folder)]
+    while stack:
+        directory = stack.pop()
+        jp2_names = []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    name = entry.name
+                    if entry.is_dir(follow_symlinks=False):
+                        if name not in PRUNED_DIRS and not name.endswith('.partial'):
+                            stack.append(entry.path)
+                    elif name.lower().endswith('.jp2'):
+                        jp2_names.append(name)
+                    elif name.lower().endswith('.zip'):
+                        inventory['zip_files'].append(entry.path)
+        except OSError as e:
+            logging.warning(f"Could not scan {directory}: {e}")
+            continue
+        if jp2_names:
+            inventory['jp2_dirs'][directory] = sorted(jp2_names)
+
+    inventory['zip_files'].sort()
+    return inventory
+
+def extract_zips(root_folder, workers=None, inventory=None):
     """
     Extract zip files ensuring original folder name is maintained.
     Processes all subdirectories recursively.
+    Archives are extracted in parallel by a process pool of `workers` processes
+    (default: number of CPU cores; lower it when all archives sit on one spinning disk).
+    Pass an inventory from scan_inventory to reuse an earlier scan of root_folder.
     """
     # Convert root_folder to absolute path
     root_folder = os.path.abspath(root_folder)
+    workers = workers or os.cpu_count() or 1
+    inventory = inventory or scan_inventory(root_folder)
 
-    # Process all subdirectories
-    for subdir, _, files in os.walk(root_folder):
-        zip_files = [f for f in files if f.lower().endswith('.zip')]
-        
-        if not zip_files:
-            continue
+    # Group the archives by folder; the list is taken before extraction, so freshly extracted folders are not revisited
+    zips_by_folder = {}
+    for zip_path in inventory['zip_files']:
+        zips_by_folder.setdefault(os.path.dirname(zip_path), []).append(os.path.basename(zip_path))
 
+    jobs = []
+    for subdir, zip_files in zips_by_folder.items():
         logging.info(f"Found {len(zip_files)} zip file(s) in {subdir}")
 
         for zip_filename in zip_files:
-            try:
-                zip_path = os.path.join(subdir, zip_filename)
-                extract_folder_name = os.path.splitext(zip_filename)[0]
-                extract_folder = os.path.join(subdir, extract_folder_name)
+            zip_path = os.path.join(subdir, zip_filename)
+            extract_folder_name = os.path.splitext(zip_filename)[0]
+            extract_folder = os.path.join(subdir, extract_folder_name)
 
-                if os.path.exists(extract_folder):
-                    logging.warning(f"Folder {extract_folder_name} already exists. Skipping.")
-                    continue
+            if os.path.exists(extract_folder):
+                logging.warning(f"Folder {extract_folder_name} already exists. Skipping.")
+                continue
 
-                os.makedirs(extract_folder, exist_ok=True)
+            jobs.append((zip_filename, zip_path, extract_folder))
 
-                with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                    zip_ref.extractall(extract_folder)
+    if not jobs:
+        return
 
+    logging.info(f"Extracting {len(jobs)} zip file(s) with {min(workers, len(jobs))} worker(s)")
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as executor:
+        futures = {executor.submit(extract_zip, zip_path, extract_folder): zip_filename
+                   for zip_filename, zip_path, extract_folder in jobs}
+        for future in as_completed(futures):
+            zip_filename = futures[future]
+            try:
+                extract_folder = future.result()
                 logging.info(f"Successfully extracted {zip_filename} to {extract_folder}")
             except zipfile.BadZipFile:
                 logging.error(f"Corrupt zip file: {zip_filename}")
@@ -50,48 +122,132 @@ def extract_zips(root_folder):
             except Exception as e:
                 logging.error(f"Unexpected error extracting {zip_filename}: {e}")
 
-def extract_jp2_files(root_folder, output_folder):
+RESOLUTION_PRIORITY = ['R10m', 'R20m', 'R60m']
+
+def select_band_files(candidates):
     """
-    Extract Sentinel-2 JP2 files from all subdirectories.
+    Pick the best-resolution JP2 per granule and band (R10m > R20m > R60m, B01/B09 skipped)
+    and the SCL layer at 20m.
+    `candidates` yields (resolution, location, file) tuples, where location is whatever the caller
+    needs to read the file later (a directory or a zip member).
+    Returns jp2_files keyed by (granule_id, band_number) and scl_files keyed by granule_id,
+    both holding (resolution, location, file).
     """
-    root_folder = os.path.abspath(root_folder) 
-    output_folder = os.path.abspath(output_folder)
-    os.makedirs(output_folder, exist_ok=True)
-
-    resolution_priority = ['R10m', 'R20m', 'R60m']
     jp2_files = {}
     scl_files = {}
 
-    for root, dirs, files in os.walk(root_folder):
-        resolution = next((res for res in resolution_priority if root.endswith(res)), None)
-        if not resolution:
-            continue
+    for resolution, location, file in candidates:
+        if file.lower().endswith('.jp2'):
+            try:
+                parts = file.split('_')
+                if len(parts) < 2:
+                    continue
 
-        for file in files:
-            if file.lower().endswith('.jp2'):
-                try:
-                    parts = file.split('_')
-                    if len(parts) < 2:
-                        continue
+                band_identifier = parts[-2]
+                granule_id = parts[0] + "_" + parts[1]
 
-                    band_identifier = parts[-2]
-                    granule_id = parts[0] + "_" + parts[1]
+                if band_identifier == 'SCL' and resolution == 'R20m':
+                    scl_files[granule_id] = (resolution, location, file)
+                    continue
 
-                    if band_identifier == 'SCL' and resolution == 'R20m':
-                        scl_files[granule_id] = (resolution, root, file)
+                if band_identifier.startswith('B'):
+                    band_number = band_identifier[1:]
+                    if band_number in ['01', '09']:  # Skip Band 01 and 09
                         continue
 
-                    if band_identifier.startswith('B'):
-                        band_number = band_identifier[1:]
-                        if band_number in ['01', '09']:  # Skip Band 01 and 09
-                            continue
+                    key = (granule_id, band_number)
+                    if key not in jp2_files or RESOLUTION_PRIORITY.index(resolution) < RESOLUTION_PRIORITY.index(jp2_files[key][0]):
+                        jp2_files[key] = (resolution, location, file)
+            except Exception as e:
+                logging.error(f"Error processing file {file}: {e}")
+
+    return jp2_files, scl_files
+
+FICLONE = 0x40049409  # ioctl to share extents between files (Btrfs, XFS, ...)
+LINK_METHODS = {
+    'auto': ['reflink', 'hardlink', 'kernel_copy', 'copy'],
+    'reflink': ['reflink'],
+    'hardlink': ['hardlink'],
+    'copy': ['copy'],
+}
+
+def reflink_file(source_path, destination_path):
+    """
+    Clone a file with FICLONE so both names share the same data blocks (copy-on-write).
+    """
+    if fcntl is None:
+        raise OSError("Reflinks are not supported on this platform")
+    with open(source_path, 'rb') as source, open(destination_path, 'wb') as destination:
+        fcntl.ioctl(destination.fileno(), FICLONE, source.fileno())
+    shutil.copystat(source_path, destination_path)
+
+def kernel_copy_file(source_path, destination_path):
+    """
+    Copy a file inside the kernel with copy_file_range (or sendfile), without user-space buffers.
+    """
+    copy_range = getattr(os, 'copy_file_range', None)
+    if copy_range is None and not hasattr(os, 'sendfile'):
+        raise OSError("No in-kernel copy available on this platform")
+    with open(source_path, 'rb') as source, open(destination_path, 'wb') as destination:
+        remaining = os.fstat(source.fileno()).st_size
+        while remaining > 0:
+            if copy_range:
+                copied = copy_range(source.fileno(), destination.fileno(), remaining)
+            else:
+                copied = os.sendfile(destination.fileno(), source.fileno(), None, remaining)
+            if copied == 0:
+                break
+            remaining -= copied
+    shutil.copystat(source_path, destination_path)
+
+def link_or_copy(source_path, destination_path, strategy='auto'):
+    """
+    Place source_path at destination_path as cheaply as the filesystem allows.
+    'auto' tries a reflink, then a hard link, then an in-kernel copy and finally shutil.copy2;
+    'reflink', 'hardlink' and 'copy' use only that method.
+    Hard links share the file with the extracted SAFE folder, which is fine as the bands are only read.
+    Returns the method that was used.
+    """
+    if os.path.lexists(destination_path):
+        os.remove(destination_path)
+
+    errors = []
+    for method in LINK_METHODS[strategy]:
+        try:
+            if method == 'reflink':
+                reflink_file(source_path, destination_path)
+            elif method == 'hardlink':
+                os.link(source_path, destination_path)
+            elif method == 'kernel_copy':
+                kernel_copy_file(source_path, destination_path)
+            else:
+                shutil.copy2(source_path, destination_path)
+            return method
+        except OSError as e:
+            errors.append(f"{method}: {e}")
+            if os.path.lexists(destination_path):
+                os.remove(destination_path)
+    raise OSError(f"Could not place {source_path} ({'; '.join(errors)})")
+
+def extract_jp2_files(root_folder, output_folder, link_strategy='auto', inventory=None):
+    """
+    Extract Sentinel-2 JP2 files from all subdirectories.
+    Files are placed with link_or_copy, so on the same filesystem they are linked instead of copied.
+    Pass an inventory from scan_inventory to reuse an earlier scan of root_folder.
+    """
+    root_folder = os.path.abspath(root_folder) 
+    output_folder = os.path.abspath(output_folder)
+    os.makedirs(output_folder, exist_ok=True)
+    inventory = inventory or scan_inventory(root_folder)
 
-                        key = (granule_id, band_number)
-                        if key not in jp2_files or resolution_priority.index(resolution) < resolution_priority.index(jp2_files[key][0]):
-                            jp2_files[key] = (resolution, root, file)
-                except Exception as e:
-                    logging.error(f"Error processing file {file}: {e}")
+    candidates = []
+    for root, files in inventory['jp2_dirs'].items():
+        resolution = next((res for res in RESOLUTION_PRIORITY if root.endswith(res)), None)
+        if not resolution:
+            continue
+        candidates.extend((resolution, root, file) for file in files)
 
+    jp2_files, scl_files = select_band_files(candidates)
     processed_granules = set()
     for (granule_id, band_number), (_, root, file) in jp2_files.items():
         try:
@@ -101,8 +257,8 @@ def extract_jp2_files(root_folder, output_folder):
             source_path = os.path.join(root, file)
             destination_path = os.path.join(granule_output_folder, file)
 
-            shutil.copy2(source_path, destination_path)
-            logging.info(f"Copied {file} (Band {band_number}) to {granule_output_folder}")
+            method = link_or_copy(source_path, destination_path, link_strategy)
+            logging.info(f"Placed {file} (Band {band_number}) in {granule_output_folder} via {method}")
             processed_granules.add(granule_id)
         except Exception as e:
             logging.error(f"Error copying file {file}: {e}")
@@ -113,19 +269,104 @@ def extract_jp2_files(root_folder, output_folder):
                 granule_output_folder = os.path.join(output_folder, granule_id)
                 source_path = os.path.join(root, file)
                 destination_path = os.path.join(granule_output_folder, file)
-                shutil.copy2(source_path, destination_path)
-                logging.info(f"Copied {file} (SCL at 20m) to {granule_output_folder}")
+                method = link_or_copy(source_path, destination_path, link_strategy)
+                logging.info(f"Placed {file} (SCL at 20m) in {granule_output_folder} via {method}")
         except Exception as e:
             logging.error(f"Error copying SCL file {file}: {e}")
 
     logging.info(f"Successfully extracted {len(jp2_files)} JP2 files and {len(scl_files)} SCL files to {output_folder}")
 
+def stream_member(zip_ref, info, destination_path):
+    """
+    Stream one zip member to disk through a temporary file, skipping it if already complete.
+    """
+    if os.path.exists(destination_path) and os.path.getsize(destination_path) == info.file_size:
+        return False
+
+    partial_path = destination_path + '.partial'
+    with zip_ref.open(info) as source, open(partial_path, 'wb') as destination:
+        shutil.copyfileobj(source, destination, 1024 * 1024)
+    os.replace(partial_path, destination_path)
+    return True
+
+def extract_bands_from_zip(zip_path, output_folder):
+    """
+    Read the central directory of a Sentinel-2 zip and stream only the selected band members
+    (same selection as extract_jp2_files) into output_folder/<granule>/.
+    Returns the number of JP2 and SCL files written.
+    """
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        candidates = []
+        for info in zip_ref.infolist():
+            if info.is_dir():
+                continue
+            member_dir, _, file = info.filename.rpartition('/')
+            resolution = next((res for res in RESOLUTION_PRIORITY if member_dir.endswith(res)), None)
+            if resolution:
+                candidates.append((resolution, info, file))
+
+        jp2_files, scl_files = select_band_files(candidates)
+
+        processed_granules = set()
+        for (granule_id, band_number), (_, info, file) in jp2_files.items():
+            granule_output_folder = os.path.join(output_folder, granule_id)
+            os.makedirs(granule_output_folder, exist_ok=True)
+            stream_member(zip_ref, info, os.path.join(granule_output_folder, file))
+            processed_granules.add(granule_id)
+
+        scl_count = 0
+        for granule_id, (_, info, file) in scl_files.items():
+            if granule_id in processed_granules:
+                stream_member(zip_ref, info, os.path.join(output_folder, granule_id, file))
+                scl_count += 1
+
+    return len(jp2_files), scl_count
+
+def extract_band_members(root_folder, output_folder, workers=None, inventory=None):
+    """
+    Pull the needed JP2 bands straight out of every zip under root_folder into output_folder,
+    without extracting the full SAFE archives first. Archives are processed in parallel.
+    Pass an inventory from scan_inventory to reuse an earlier scan of root_folder.
+    """
+    root_folder = os.path.abspath(root_folder)
+    output_folder = os.path.abspath(output_folder)
+    os.makedirs(output_folder, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+
+    zip_paths = (inventory or scan_inventory(root_folder))['zip_files']
+    if not zip_paths:
+        logging.warning(f"No zip files found in {root_folder}")
+        return
+
+    logging.info(f"Extracting bands from {len(zip_paths)} zip file(s) with {min(workers, len(zip_paths))} worker(s)")
+    with ProcessPoolExecutor(max_workers=min(workers, len(zip_paths))) as executor:
+        futures = {executor.submit(extract_bands_from_zip, zip_path, output_folder): zip_path
+                   for zip_path in zip_paths}
+        for future in as_completed(futures):
+            zip_filename = os.path.basename(futures[future])
+            try:
+                jp2_count, scl_count = future.result()
+                logging.info(f"Extracted {jp2_count} JP2 files and {scl_count} SCL files from {zip_filename}")
+            except zipfile.BadZipFile:
+                logging.error(f"Corrupt zip file: {zip_filename}")
+            except PermissionError:
+                logging.error(f"Permission denied when extracting: {zip_filename}")
+            except Exception as e:
+                logging.error(f"Unexpected error extracting {zip_filename}: {e}")
+
 # Main execution
 if __name__ == "__main__":
     current_dir = r'Sentinel_2'  # Root directory containing ZIP files and subfolders
     output_dir = r'SN2_Extract'  # Folder to save extracted JP2 files
+    direct_extract = True  # True = stream only the needed bands from each zip, False = full extract then copy
+    link_strategy = 'auto'  # 'auto', 'reflink', 'hardlink' or 'copy' when placing bands from extracted folders
+
+    inventory = scan_inventory(current_dir)  # One scan of the download tree, shared by the steps below
 
-    extract_zips(current_dir)  # Extract ZIP files recursively
-    extract_jp2_files(current_dir, output_dir)  # Extract JP2 files recursively
+    if direct_extract:
+        extract_band_members(current_dir, output_dir, inventory=inventory)  # Read selected band members straight from the zips
+    else:
+        extract_zips(current_dir, inventory=inventory)  # Extract ZIP files recursively
+        extract_jp2_files(current_dir, output_dir, link_strategy)  # Rescan: extraction added the SAFE folders
 
     logging.info("Extraction completed.")
\ No newline at end of file
@@ -1,9 +1,15 @@
 import os
 import sys
+import shutil
+import tempfile
+import zipfile
+import numpy as np
 from osgeo import gdal
 from pathlib import Path
 import time
 import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from extract_zips import RESOLUTION_PRIORITY, select_band_files, scan_inventory
 def setup_logging():
     """
     Set up logging to help diagnose issues.
@@ -14,15 +20,62 @@ def setup_logging():
         handlers=[
             logging.FileHandler('sentinel_processing.log'),
             logging.StreamHandler(sys.stdout)
-        ]
+        ],
+        force=True  # extract_zips configures logging on import
     )
     return logging.getLogger(__name__)
 
 logger = setup_logging()
 
-def resample_image(input_path, output_path, target_resolution=10):
+# Named compression profiles for output rasters. 'level' is the codec level (None = codec default),
+# 'num_threads' the encoder threads (None = follow GDAL_NUM_THREADS, which the granule workers set).
+OUTPUT_PROFILES = {
+    'fast': {'compress': 'ZSTD', 'level': 1, 'predictor': 2, 'block_size': 256, 'num_threads': None},
+    'archive': {'compress': 'ZSTD', 'level': 19, 'predictor': 2, 'block_size': 512, 'num_threads': None},
+    'compat': {'compress': 'LZW', 'level': None, 'predictor': 2, 'block_size': 256, 'num_threads': None},
+}
+
+# Creation option carrying the compression level, per codec
+LEVEL_OPTIONS = {'ZSTD': 'ZSTD_LEVEL', 'DEFLATE': 'ZLEVEL', 'LZMA': 'LZMA_PRESET',
+                 'LERC_ZSTD': 'ZSTD_LEVEL', 'LERC_DEFLATE': 'ZLEVEL'}
+
+def resolve_profile(profile):
+    """
+    Return the profile dict for an OUTPUT_PROFILES name; a profile dict is returned as is.
+    """
+    return OUTPUT_PROFILES[profile] if isinstance(profile, str) else profile
+
+def creation_options(profile, driver='GTiff', bigtiff=False):
+    """
+    Build GDAL creation options for an OUTPUT_PROFILES name (or a profile dict) and driver ('GTiff' or 'COG').
+    """
+    profile = resolve_profile(profile)
+
+    options = [f"COMPRESS={profile['compress']}"]
+    if profile['level'] is not None:
+        level_option = 'LEVEL' if driver == 'COG' else LEVEL_OPTIONS[profile['compress']]
+        options.append(f"{level_option}={profile['level']}")
+    if profile['compress'].startswith('LERC'):
+        options.append('MAX_Z_ERROR=0')  # Lossless
+    if profile['predictor']:
+        if driver == 'COG':
+            options.append(f"PREDICTOR={'FLOATING_POINT' if profile['predictor'] == 3 else 'STANDARD'}")
+        else:
+            options.append(f"PREDICTOR={profile['predictor']}")
+    if driver == 'COG':
+        options.append(f"BLOCKSIZE={profile['block_size']}")
+    else:
+        options.extend(['TILED=YES', f"BLOCKXSIZE={profile['block_size']}", f"BLOCKYSIZE={profile['block_size']}"])
+    if profile['num_threads']:
+        options.append(f"NUM_THREADS={profile['num_threads']}")
+    if bigtiff:
+        options.append('BIGTIFF=YES')
+    return options
+
+def resample_image(input_path, output_path, target_resolution=10, profile='compat'):
     """
-    Resamples a single image to a target resolution using GDAL and saves it as a compressed GeoTIFF file.
+    Resamples a single image to a target resolution using GDAL and saves it as a compressed GeoTIFF file
+    using the named OUTPUT_PROFILES compression profile.
     """
     try:
         logger.info(f"Resampling image: {input_path} to {output_path} at {target_resolution}m resolution.")
@@ -52,14 +105,7 @@ def resample_image(input_path, output_path, target_resolution=10):
             width=dst_xsize,
             height=dst_ysize,
             resampleAlg=gdal.GRA_NearestNeighbour,
-            creationOptions=[
-                'COMPRESS=LZW',
-                'PREDICTOR=2',
-                'TILED=YES',
-                'BLOCKXSIZE=256',
-                'BLOCKYSIZE=256',
-                'BIGTIFF=YES'
-            ]
+            creationOptions=creation_options(profile, bigtiff=True)
         )
         
         # Perform resampling with compression
@@ -78,6 +124,110 @@ def resample_image(input_path, output_path, target_resolution=10):
         logger.error(f"Error resampling image {input_path}: {e}", exc_info=True)
         return False
 
+def write_band_stack(src_ds, output_path, stack_options, memory_budget_mb=256, block_size=256):
+    """
+    Copy src_ds (the band stack VRT) to a GeoTIFF in full-width windows whose height is a multiple
+    of block_size. Each window is written with one dataset-level WriteRaster, so every
+    (pixel-interleaved) tile is complete when it is flushed and is compressed exactly once.
+    Memory stays around memory_budget_mb however large the raster is, counting the window, the
+    GDAL cache holding its tiles until the flush and the statistics scratch. Per-band
+    min/max/mean/std are gathered in the same pass and stored as band statistics.
+    Returns the open output dataset.
+    """
+    x_size = src_ds.RasterXSize
+    y_size = src_ds.RasterYSize
+    band_count = src_ds.RasterCount
+    data_type = src_ds.GetRasterBand(1).DataType
+    item_size = gdal.GetDataTypeSize(data_type) // 8
+
+    # Per row: the window for all bands, the same pixels as dirty tiles in the GDAL cache,
+    # one masked copy of a band and its float64 squares
+    window_row_bytes = x_size * band_count * item_size
+    row_bytes = 2 * window_row_bytes + x_size * (item_size + 8)
+    window_rows = (memory_budget_mb * 1024 * 1024 // row_bytes) // block_size * block_size
+    # The dirty tiles may use at most half of the GDAL cache, the rest is for the source blocks
+    cache_rows = (gdal.GetCacheMax() // 2 // window_row_bytes) // block_size * block_size
+    if cache_rows < block_size:
+        logger.warning(f"GDAL cache ({gdal.GetCacheMax() // 1024 // 1024} MB) is too small for one row of "
+                       f"{block_size}px tiles; partly written tiles may be evicted and rewritten")
+    window_rows = max(block_size, min(window_rows, cache_rows))
+
+    driver = gdal.GetDriverByName('GTiff')
+    output_ds = driver.Create(str(output_path), x_size, y_size, band_count, data_type, options=stack_options)
+    output_ds.SetGeoTransform(src_ds.GetGeoTransform())
+    output_ds.SetProjection(src_ds.GetProjection())
+
+    nodata = [src_ds.GetRasterBand(idx).GetNoDataValue() for idx in range(1, band_count + 1)]
+    for idx, value in enumerate(nodata, start=1):
+        if value is not None:
+            output_ds.GetRasterBand(idx).SetNoDataValue(value)
+
+    count = np.zeros(band_count, dtype=np.int64)
+    total = np.zeros(band_count, dtype=np.float64)
+    total_sq = np.zeros(band_count, dtype=np.float64)
+    minimum = np.full(band_count, np.inf)
+    maximum = np.full(band_count, -np.inf)
+
+    logger.info(f"Writing {band_count} bands in windows of {window_rows} rows to {output_path}")
+    for y_off in range(0, y_size, window_rows):
+        rows = min(window_rows, y_size - y_off)
+        window = src_ds.ReadAsArray(0, y_off, x_size, rows)
+        if band_count == 1:
+            window = window[np.newaxis]
+
+        # All bands at once, so no tile is evicted while only some of its bands are written
+        output_ds.WriteRaster(0, y_off, x_size, rows, window, buf_type=data_type)
+
+        for idx in range(band_count):
+            band_data = window[idx]
+            values = band_data[band_data != nodata[idx]] if nodata[idx] is not None else band_data
+            if values.size:
+                count[idx] += values.size
+                total[idx] += values.sum(dtype=np.float64)
+                total_sq[idx] += np.square(values, dtype=np.float64).sum()
+                minimum[idx] = min(minimum[idx], values.min())
+                maximum[idx] = max(maximum[idx], values.max())
+
+        # Every tile in the window is complete, so write it out instead of keeping it cached
+        window = None
+        output_ds.FlushCache()
+
+    for idx in range(band_count):
+        if count[idx]:
+            mean = total[idx] / count[idx]
+            std = np.sqrt(max(total_sq[idx] / count[idx] - mean * mean, 0.0))
+            output_ds.GetRasterBand(idx + 1).SetStatistics(float(minimum[idx]), float(maximum[idx]),
+                                                           float(mean), float(std))
+    return output_ds
+
+def set_band_descriptions(dataset, band_names):
+    """
+    Set band descriptions and color interpretation for default RGB display.
+    """
+    color_map = {
+        'B04': gdal.GCI_RedBand,
+        'B03': gdal.GCI_GreenBand,
+        'B02': gdal.GCI_BlueBand
+    }
+    for idx, band_name in enumerate(band_names, start=1):
+        band = dataset.GetRasterBand(idx)
+        if band:
+            band.SetDescription(band_name)
+            if band_name in color_map:
+                band.SetColorInterpretation(color_map[band_name])
+
+def at_resolution(input_path, target_resolution):
+    """
+    Check from the geotransform (header only, no pixels read) whether a raster already has
+    the target pixel size.
+    """
+    src_ds = gdal.Open(str(input_path))
+    if not src_ds:
+        return False
+    pixel_size = abs(src_ds.GetGeoTransform()[1])
+    src_ds = None
+    return abs(pixel_size - target_resolution) < 1e-6
+
 def safe_remove(file_path, max_attempts=5, delay=1):
     """
     Safely remove a file with multiple attempts and delay between attempts.
@@ -127,15 +277,33 @@ def build_pyramids_nearest(raster_path, overview_levels=[2, 4, 8, 16, 32], resam
         logger.error(f"Error building pyramids for {raster_path}: {e}", exc_info=True)
         return False
 
-def process_bands(input_folder, output_folder, scl_output_folder=None):
+def process_bands(input_folder, output_folder, scl_output_folder=None, band_files=None, temp_dir=None,
+                  pipeline='vrt', target_resolution=10, stack_writer='windowed', memory_budget_mb=256,
+                  output_format='GTiff', stack_profile='compat', scl_profile='compat', intermediate_profile='fast'):
     """
     Processes Sentinel-2 band files in a given input folder with GDAL compression.
     Optionally exports SCL (Scene Classification Layer) to a separate folder.
     
     Args:
-        input_folder (str or Path): Input folder containing JP2 files
+        input_folder (str or Path): Input folder containing JP2 files (or the zip the bands come from)
         output_folder (str or Path): Output folder for band files
         scl_output_folder (str or Path, optional): Output folder for SCL files
+        band_files (list, optional): GDAL paths of the JP2 files to use instead of the JP2 files
+            in input_folder, e.g. /vsizip/ paths into a downloaded product
+        temp_dir (str or Path, optional): Folder for intermediate files of the legacy pipeline
+            (default: output_folder/temp)
+        pipeline (str): 'vrt' resamples inside an in-memory VRT and encodes the stack once,
+            'legacy' resamples every band to a temporary GeoTIFF first
+        target_resolution (int): Output pixel size in metres
+        stack_writer (str): 'windowed' writes the stack with write_band_stack (bounded memory,
+            statistics in the same pass), 'translate' uses gdal.Translate with stats=True
+        memory_budget_mb (int): Memory budget of the windowed writer
+        output_format (str): 'GTiff' (tiled GeoTIFF, overviews built afterwards) or 'COG'
+            (Cloud-Optimized GeoTIFF with overviews and statistics from a single Translate of the VRT;
+            stack_writer does not apply)
+        stack_profile (str or dict): OUTPUT_PROFILES name or profile dict for the band stack
+        scl_profile (str or dict): OUTPUT_PROFILES name or profile dict for the SCL output
+        intermediate_profile (str or dict): OUTPUT_PROFILES name or profile dict for temporary GeoTIFFs
     """
     temp_folder = None
     try:
@@ -150,52 +318,67 @@ def process_bands(input_folder, output_folder, scl_output_folder=None):
             scl_output_folder = Path(scl_output_folder)
             scl_output_folder.mkdir(parents=True, exist_ok=True)
         
-        jp2_files = list(input_folder.glob('*.jp2'))
+        if band_files is None:
+            band_files = [str(jp2_file) for jp2_file in input_folder.glob('*.jp2')]
+        jp2_files = list(band_files)
         if not jp2_files:
             logger.warning(f"No JP2 files found in the input folder: {input_folder}")
             return
 
-        temp_folder = output_folder / 'temp'
-        temp_folder.mkdir(parents=True, exist_ok=True)
+        # Band mapping
+        band_map = {
+            'B01': 'B01', 'B02': 'B02', 'B03': 'B03', 'B04': 'B04', 'B05': 'B05', 'B06': 'B06', 'B07': 'B07', 
+            'B08': 'B08', 'B8A': 'B8A', 'B09': 'B09','B11': 'B11', 'B12': 'B12'
+        }
 
-        resampled_files = []
         band_paths = {}
         scl_file = None
-
         for jp2_file in jp2_files:
-            output_path = temp_folder / f"{jp2_file.stem}_resampled.tif"
+            jp2_name = os.path.basename(jp2_file)
             
-            if resample_image(str(jp2_file), str(output_path)):
-                resampled_files.append(str(output_path))
-                
-                # Band mapping
-                band_map = {
-                    'B01': 'B01', 'B02': 'B02', 'B03': 'B03', 'B04': 'B04', 'B05': 'B05', 'B06': 'B06', 'B07': 'B07', 
-                    'B08': 'B08', 'B8A': 'B8A', 'B09': 'B09','B11': 'B11', 'B12': 'B12'
-                }
-                
-                # Check for SCL file
-                if 'SCL' in jp2_file.name:
-                    scl_file = str(output_path)
+            # Check for SCL file
+            if 'SCL' in jp2_name:
+                scl_file = jp2_file
+                continue
+            
+            for band_key in band_map:
+                if band_key in jp2_name:
+                    band_paths[band_key] = jp2_file
+                    break
+
+        resampled_files = []
+        if pipeline == 'legacy':
+            temp_folder = Path(temp_dir) if temp_dir else output_folder / 'temp'
+            temp_folder.mkdir(parents=True, exist_ok=True)
+
+            sources = dict(band_paths, SCL=scl_file) if scl_file else dict(band_paths)
+            resampled = {}
+            for band_key, jp2_file in sources.items():
+                jp2_name = os.path.basename(jp2_file)
+                if at_resolution(jp2_file, target_resolution):
+                    # Already at the target resolution: temp.vrt references the JP2 itself
+                    logger.info(f"{jp2_name} is already at {target_resolution}m, skipping resampling.")
+                    resampled[band_key] = jp2_file
                     continue
-                
-                for band_key in band_map:
-                    if band_key in jp2_file.name:
-                        band_paths[band_key] = str(output_path)
-                        break
+                output_path = temp_folder / f"{os.path.splitext(jp2_name)[0]}_resampled.tif"
+                if resample_image(jp2_file, str(output_path), target_resolution, intermediate_profile):
+                    resampled[band_key] = str(output_path)
+                    resampled_files.append(str(output_path))
+            scl_file = resampled.pop('SCL', None)
+            band_paths = resampled
 
         # Process regular bands
         # B04, B03, B02 for natural color composite as default
         ordered_bands = ['B04', 'B03', 'B02', 'B01', 'B05', 'B06', 'B07', 
                          'B08', 'B8A', 'B09', 'B11', 'B12']
         final_band_order = [band for band in ordered_bands if band in band_paths]
-        final_resampled_files = [band_paths[band] for band in final_band_order]
+        final_band_files = [band_paths[band] for band in final_band_order]
 
-        if not final_resampled_files:
+        if not final_band_files:
             raise ValueError("No valid band files were processed")
 
         # Filename generation
-        sample_filename = jp2_files[0].name
+        sample_filename = os.path.basename(jp2_files[0])
         parts = sample_filename.split('_')
         tile_date_timestamp = f"{parts[0]}_{parts[1]}"
         output_filename = f"{tile_date_timestamp}.tif"
@@ -204,49 +387,76 @@ def process_bands(input_folder, output_folder, scl_output_folder=None):
         logger.info(f"Creating compressed output file: {output_path}")
 
         # Create VRT with options
-        vrt_options = gdal.BuildVRTOptions(separate=True)
-        vrt_path = str(temp_folder / 'temp.vrt')
-        vrt_ds = gdal.BuildVRT(vrt_path, final_resampled_files, options=vrt_options)
+        vrt_path = None
+        if pipeline == 'legacy':
+            vrt_options = gdal.BuildVRTOptions(separate=True)
+            vrt_path = str(temp_folder / 'temp.vrt')
+            vrt_ds = gdal.BuildVRT(vrt_path, final_band_files, options=vrt_options)
+        else:
+            # In-memory VRT: the 20m sources are upsampled on the fly (nearest), so every band is
+            # decoded once and the stack is encoded once. Sources already at the target resolution
+            # map one-to-one and are read by reference without resampling.
+            native_bands = [band for band, path in zip(final_band_order, final_band_files)
+                            if at_resolution(path, target_resolution)]
+            logger.info(f"{len(native_bands)} of {len(final_band_files)} bands already at {target_resolution}m: "
+                        f"{', '.join(native_bands) or 'none'}")
+            vrt_options = gdal.BuildVRTOptions(
+                separate=True,
+                xRes=target_resolution,
+                yRes=target_resolution,
+                resampleAlg='nearest'
+            )
+            vrt_ds = gdal.BuildVRT('', final_band_files, options=vrt_options)
         
         # Create final output with compression
-        translate_options = gdal.TranslateOptions(
-            format='GTiff',
-            creationOptions=[
-                'COMPRESS=LZW',
-                'PREDICTOR=2',
-                'TILED=YES',
-                'BLOCKXSIZE=256',
-                'BLOCKYSIZE=256',
-                'BIGTIFF=YES',
-            ],
-            stats=True  # <-- THIS IS THE KEY FIX: Calculate and save statistics
-        )
-        
-        output_ds = gdal.Translate(
-            destName=str(output_path),
-            srcDS=vrt_ds,
-            options=translate_options
-        )
+        stack_creation_options = creation_options(stack_profile, bigtiff=True)
+        if output_format == 'COG':
+            # One Translate from the VRT: the COG driver builds the overviews while writing and,
+            # with STATISTICS=YES (GDAL >= 3.8), stores the statistics too, so the output is never
+            # reopened. Band metadata goes on the VRT first.
+            set_band_descriptions(vrt_ds, final_band_order)
+            cog_options = creation_options(stack_profile, 'COG', bigtiff=True) + ['RESAMPLING=NEAREST']
+            cog_statistics = int(gdal.VersionNum()) >= 3080000
+            if cog_statistics:
+                cog_options.append('STATISTICS=YES')
+            else:
+                logger.warning("GDAL < 3.8 has no COG STATISTICS option, computing statistics with stats=True")
+            translate_options = gdal.TranslateOptions(
+                format='COG',
+                creationOptions=cog_options,
+                stats=not cog_statistics
+            )
+            output_ds = gdal.Translate(
+                destName=str(output_path),
+                srcDS=vrt_ds,
+                options=translate_options
+            )
+        elif stack_writer == 'windowed':
+            output_ds = write_band_stack(vrt_ds, output_path, stack_creation_options, memory_budget_mb,
+                                         resolve_profile(stack_profile)['block_size'])
+        else:
+            translate_options = gdal.TranslateOptions(
+                format='GTiff',
+                creationOptions=stack_creation_options,
+                stats=True  # <-- THIS IS THE KEY FIX: Calculate and save statistics
+            )
+            
+            output_ds = gdal.Translate(
+                destName=str(output_path),
+                srcDS=vrt_ds,
+                options=translate_options
+            )
 
-        # Set band descriptions and color interpretation for default RGB display
-        color_map = {
-            'B04': gdal.GCI_RedBand,
-            'B03': gdal.GCI_GreenBand,
-            'B02': gdal.GCI_BlueBand
-        }
-        for idx, band_name in enumerate(final_band_order, start=1):
-            band = output_ds.GetRasterBand(idx)
-            if band:
-                band.SetDescription(band_name)
-                if band_name in color_map:
-                    band.SetColorInterpretation(color_map[band_name])
+        if output_format != 'COG':
+            set_band_descriptions(output_ds, final_band_order)
 
         # Close VRT dataset
         output_ds = None
         vrt_ds = None
 
-        # ✅ BUILD PYRAMIDS HERE
-        build_pyramids_nearest(str(output_path))
+        # ✅ BUILD PYRAMIDS HERE (a COG already has them)
+        if output_format != 'COG':
+            build_pyramids_nearest(str(output_path))
         
         if not output_path.exists():
             raise ValueError(f"Failed to create output file: {output_path}")
@@ -256,15 +466,17 @@ def process_bands(input_folder, output_folder, scl_output_folder=None):
             scl_output_filename = f"{tile_date_timestamp}_SCL.tif"
             scl_output_path = scl_output_folder / scl_output_filename
             
+            # The legacy pipeline already resampled SCL; otherwise Translate resamples it directly
+            # unless it is already at the target resolution
+            scl_resampling = {} if pipeline == 'legacy' or at_resolution(scl_file, target_resolution) else {
+                'xRes': target_resolution,
+                'yRes': target_resolution,
+                'resampleAlg': gdal.GRA_NearestNeighbour
+            }
             translate_options_scl = gdal.TranslateOptions(
                 format='GTiff',
-                creationOptions=[
-                    'COMPRESS=LZW',
-                    'PREDICTOR=2',
-                    'TILED=YES',
-                    'BLOCKXSIZE=256',
-                    'BLOCKYSIZE=256'
-                ]
+                creationOptions=creation_options(scl_profile),
+                **scl_resampling
             )
             
             gdal.Translate(
@@ -276,16 +488,17 @@ def process_bands(input_folder, output_folder, scl_output_folder=None):
             logger.info(f"Exported SCL file: {scl_output_path}")
         
         # Clean up temporary files
-        logger.info("Cleaning up temporary files.")
-        for file in resampled_files:
-            safe_remove(file)
-        safe_remove(vrt_path)
-        
-        if temp_folder and temp_folder.exists():
-            try:
-                temp_folder.rmdir()
-            except Exception as e:
-                logger.warning(f"Could not remove temp folder: {e}")
+        if temp_folder:
+            logger.info("Cleaning up temporary files.")
+            for file in resampled_files:
+                safe_remove(file)
+            safe_remove(vrt_path)
+            
+            if temp_folder.exists():
+                try:
+                    temp_folder.rmdir()
+                except Exception as e:
+                    logger.warning(f"Could not remove temp folder: {e}")
 
     except Exception as e:
         logger.error(f"Error processing bands in {input_folder}: {e}", exc_info=True)
@@ -301,35 +514,176 @@ def process_bands(input_folder, output_folder, scl_output_folder=None):
             except Exception as e:
                 logger.warning(f"Failed final cleanup of temp folder: {e}")
 
-def find_and_process_folders(root_folder, output_folder, scl_output_folder):
+# Set in each pool worker by init_granule_worker
+worker_temp_dir = None
+
+def init_granule_worker(gdal_cache_mb, gdal_threads, temp_root):
     """
-    Searches for and processes folders containing .jp2 files.
+    Configure GDAL in a granule pool worker: its share of the block cache, its share of the
+    cores for JP2 decoding and compression, and a private temp directory.
+    """
+    global worker_temp_dir
+    gdal.UseExceptions()
+    gdal.SetCacheMax(gdal_cache_mb * 1024 * 1024)
+    gdal.SetConfigOption('GDAL_CACHEMAX', str(gdal_cache_mb))
+    gdal.SetConfigOption('GDAL_NUM_THREADS', str(gdal_threads))
+
+    worker_temp_dir = os.path.join(temp_root, f"worker_{os.getpid()}")
+    os.makedirs(worker_temp_dir, exist_ok=True)
+    gdal.SetConfigOption('CPL_TMPDIR', worker_temp_dir)
+    tempfile.tempdir = worker_temp_dir
+
+def process_granule(input_folder, output_folder, scl_output_folder, band_files, band_options):
     """
+    Pool task: process one granule, keeping intermediates in the worker's temp directory.
+    """
+    temp_dir = os.path.join(worker_temp_dir, Path(output_folder).name) if worker_temp_dir else None
+    process_bands(input_folder, output_folder, scl_output_folder, band_files=band_files, temp_dir=temp_dir,
+                  **band_options)
+
+def process_granules(tasks, workers=1, gdal_cache_mb=2048, band_options=None):
+    """
+    Run process_bands for every (input_folder, output_folder, scl_output_folder, band_files) task,
+    passing band_options (e.g. {'pipeline': 'legacy'}) as extra keyword arguments.
+    With workers > 1 the granules are processed in a process pool; the GDAL cache budget
+    (gdal_cache_mb) and the CPU cores are split between the workers so they are not oversubscribed.
+    A failed granule does not stop the others.
+    Returns a dict with the 'succeeded' input folders and the 'failed' ones mapped to their error.
+    """
+    results = {'succeeded': [], 'failed': {}}
+    if not tasks:
+        return results
+
+    band_options = band_options or {}
+    workers = max(1, min(workers, len(tasks)))
+    if workers == 1:
+        for task in tasks:
+            try:
+                process_bands(*task[:3], band_files=task[3], **band_options)
+                results['succeeded'].append(str(task[0]))
+            except Exception as e:
+                results['failed'][str(task[0])] = str(e)
+        return results
+
+    gdal_threads = max(1, (os.cpu_count() or 1) // workers)
+    temp_root = tempfile.mkdtemp(prefix='sentinel_granules_')
+    logger.info(f"Processing {len(tasks)} granules with {workers} workers "
+                f"({gdal_threads} GDAL threads and {gdal_cache_mb // workers} MB cache each)")
     try:
-        root_folder = Path(root_folder)
-        output_folder = Path(output_folder)
-        scl_output_folder = Path(scl_output_folder)
-        
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_granule_worker,
+                                 initargs=(gdal_cache_mb // workers, gdal_threads, temp_root)) as executor:
+            futures = {executor.submit(process_granule, *task, band_options): str(task[0]) for task in tasks}
+            for future in as_completed(futures):
+                input_folder = futures[future]
+                try:
+                    future.result()
+                    results['succeeded'].append(input_folder)
+                    logger.info(f"Finished {input_folder}")
+                except Exception as e:
+                    results['failed'][input_folder] = str(e)
+                    logger.error(f"Failed {input_folder}: {e}")
+    finally:
+        shutil.rmtree(temp_root, ignore_errors=True)
+    return results
+
+def log_granule_results(results):
+    """
+    Summarise the per-granule outcome of process_granules.
+    """
+    for input_folder, error in sorted(results['failed'].items()):
+        logger.error(f"Granule failed: {input_folder}: {error}")
+    logger.info(f"{len(results['succeeded'])} granules processed, {len(results['failed'])} failed.")
+
+def find_and_process_folders(root_folder, output_folder, scl_output_folder, inventory=None,
+                             workers=1, gdal_cache_mb=2048, band_options=None):
+    """
+    Searches for and processes folders containing .jp2 files.
+    Pass an inventory from scan_inventory to reuse an earlier scan of root_folder.
+    Granules are processed by process_granules with `workers` processes; returns its results.
+    """
+    root_folder = Path(os.path.abspath(root_folder))
+    output_folder = Path(output_folder)
+    scl_output_folder = Path(scl_output_folder)
+    
+    if inventory is None:
         logger.info(f"Searching for folders in: {root_folder}")
-        
-        processed_folders = 0
-        for dirpath in root_folder.rglob('*'):
-            if dirpath.is_dir() and any(f.suffix == '.jp2' for f in dirpath.iterdir()):
-                relative_path = dirpath.relative_to(root_folder)
-                current_output_folder = output_folder / relative_path
-                current_scl_output_folder = scl_output_folder / relative_path
-                logger.info(f"Found JP2 files in: {dirpath}. Processing...")
-                process_bands(dirpath, current_output_folder, current_scl_output_folder)
-                processed_folders += 1
-        
-        if processed_folders == 0:
-            logger.warning("No folders with JP2 files were found to process.")
-        else:
-            logger.info(f"All {processed_folders} folders processed.")
-        
-    except Exception as e:
-        logger.error(f"Error processing folders: {e}", exc_info=True)
-        sys.exit(1)
+        inventory = scan_inventory(root_folder)
+    
+    tasks = []
+    for directory, jp2_names in sorted(inventory['jp2_dirs'].items()):
+        relative_path = Path(directory).relative_to(root_folder)
+        logger.info(f"Found JP2 files in: {directory}")
+        tasks.append((directory, str(output_folder / relative_path), str(scl_output_folder / relative_path),
+                      [os.path.join(directory, name) for name in jp2_names]))
+    
+    if not tasks:
+        logger.warning("No folders with JP2 files were found to process.")
+    
+    results = process_granules(tasks, workers, gdal_cache_mb, band_options)
+    if tasks:
+        log_granule_results(results)
+    return results
+
+def find_and_process_zips(root_folder, output_folder, scl_output_folder, workers=1, gdal_cache_mb=2048,
+                          band_options=None):
+    """
+    Processes downloaded Sentinel-2 zip products directly, reading the selected band members
+    through GDAL /vsizip/ paths so nothing has to be extracted or copied first.
+    Outputs use the same <granule> layout as the SN2_Extract route.
+    Granules are processed by process_granules with `workers` processes; returns its results.
+    """
+    root_folder = Path(root_folder)
+    output_folder = Path(output_folder)
+    scl_output_folder = Path(scl_output_folder)
+    
+    logger.info(f"Searching for zip products in: {root_folder}")
+    
+    results = {'succeeded': [], 'failed': {}}
+    tasks = []
+    for zip_path in map(Path, scan_inventory(root_folder)['zip_files']):
+        try:
+            granules = zip_band_files(zip_path)
+        except zipfile.BadZipFile as e:
+            results['failed'][str(zip_path)] = f"Corrupt zip file: {e}"
+            continue
+        for granule_id, band_files in granules.items():
+            logger.info(f"Found {len(band_files)} band files for {granule_id} in {zip_path.name}")
+            tasks.append((str(zip_path), str(output_folder / granule_id), str(scl_output_folder / granule_id),
+                          band_files))
+    
+    if not tasks:
+        logger.warning("No zip products with JP2 bands were found to process.")
+    
+    pool_results = process_granules(tasks, workers, gdal_cache_mb, band_options)
+    results['succeeded'] = pool_results['succeeded']
+    results['failed'].update(pool_results['failed'])
+    if tasks or results['failed']:
+        log_granule_results(results)
+    return results
+
+def zip_band_files(zip_path):
+    """
+    Select the band members of a Sentinel-2 zip (same rules as extract_zips) and return
+    /vsizip/ paths to them grouped by granule id.
+    """
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        candidates = []
+        for member in zip_ref.namelist():
+            member_dir, _, file = member.rpartition('/')
+            resolution = next((res for res in RESOLUTION_PRIORITY if member_dir.endswith(res)), None)
+            if resolution:
+                candidates.append((resolution, member, file))
+    
+    jp2_files, scl_files = select_band_files(candidates)
+    
+    vsizip_root = f"/vsizip/{Path(zip_path).resolve().as_posix()}"
+    granules = {}
+    for (granule_id, _), (_, member, _) in sorted(jp2_files.items()):
+        granules.setdefault(granule_id, []).append(f"{vsizip_root}/{member}")
+    for granule_id, (_, member, _) in scl_files.items():
+        if granule_id in granules:
+            granules[granule_id].append(f"{vsizip_root}/{member}")
+    return granules
 
 def main():
     try:
@@ -340,11 +694,37 @@ def main():
         current_dir = Path.cwd()
         logger.info(f"Current working directory: {current_dir}")
 
+        # 'extracted' = JP2 files in SN2_Extract, 'zip' = read the bands straight from the Sentinel_2 zips
+        input_mode = 'extracted'
+        granule_workers = max(1, (os.cpu_count() or 1) // 2)  # Granules processed at once (1 = sequential)
+        gdal_cache_mb = 2048  # Total GDAL block cache, split between the granule workers
+        # Extra process_bands settings; 'pipeline': 'vrt' stacks in memory, 'legacy' uses temp GeoTIFFs
+        # 'stack_writer': 'windowed' caps memory at 'memory_budget_mb', 'translate' uses gdal.Translate
+        # 'output_format': 'COG' writes a Cloud-Optimized GeoTIFF with overviews and statistics in one Translate
+        # '*_profile': OUTPUT_PROFILES entry ('fast', 'archive', 'compat') for each kind of output
+        band_options = {'pipeline': 'vrt', 'stack_writer': 'windowed', 'memory_budget_mb': 256,
+                        'output_format': 'GTiff', 'stack_profile': 'compat', 'scl_profile': 'compat',
+                        'intermediate_profile': 'fast'}
+
         # Check input folders
         root_folder = current_dir / 'SN2_Extract'
         output_folder = current_dir / 'Raster_Processed'
         scl_output_folder = current_dir / 'SCL_Classified'
 
+        if input_mode == 'zip':
+            zip_folder = current_dir / 'Sentinel_2'
+            if not zip_folder.exists():
+                logger.error(f"Input folder 'Sentinel_2' does not exist in {current_dir}")
+                sys.exit(1)
+            output_folder.mkdir(parents=True, exist_ok=True)
+            scl_output_folder.mkdir(parents=True, exist_ok=True)
+            results = find_and_process_zips(zip_folder, output_folder, scl_output_folder,
+                                            granule_workers, gdal_cache_mb, band_options)
+            logger.info("Processing complete.")
+            if results['failed']:
+                sys.exit(1)
+            return
+
         # Check if input folder exists
         if not root_folder.exists():
             logger.error(f"Input folder 'SN2_Extract' does not exist in {current_dir}")
@@ -355,20 +735,24 @@ def main():
         output_folder.mkdir(parents=True, exist_ok=True)
         scl_output_folder.mkdir(parents=True, exist_ok=True)
 
-        # Find and process JP2 files
-        jp2_files = list(root_folder.rglob('*.jp2'))
+        # Find JP2 files with a single scan that processing reuses
+        inventory = scan_inventory(root_folder)
+        jp2_count = sum(len(names) for names in inventory['jp2_dirs'].values())
         
-        if not jp2_files:
+        if not jp2_count:
             logger.error(f"No .jp2 files found in {root_folder} or its subdirectories.")
             logger.info("Ensure Sentinel-2 .jp2 files are present in the 'SN2_Extract' folder.")
             sys.exit(1)
 
-        logger.info(f"Found {len(jp2_files)} JP2 files to process")
+        logger.info(f"Found {jp2_count} JP2 files in {len(inventory['jp2_dirs'])} folders to process")
         
         # Run processing
-        find_and_process_folders(root_folder, output_folder, scl_output_folder)
+        results = find_and_process_folders(root_folder, output_folder, scl_output_folder, inventory,
+                                           granule_workers, gdal_cache_mb, band_options)
         
         logger.info("Processing complete.")
+        if results['failed']:
+            sys.exit(1)
 
     except Exception as e:
         logger.critical(f"An unexpected error occurred in main(): {e}", exc_info=True)